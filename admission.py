@@ -0,0 +1,177 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+from config import (ADMISSION_MAX_DURATION_SECONDS, ADMISSION_MAX_PENDING_PER_CHAT, ADMISSION_MAX_WAIT_SECONDS,
+                    COST_SHARED_RTF, COST_LANGUAGE_RTF, COST_FIXED_SECONDS, COST_SMOOTHING, COST_MODEL_PATH)
+
+# Etapas de las métricas que se hacen una vez por video y las que se repiten por idioma
+SHARED_STAGES = ('decoding', 'activity', 'separating', 'emotion', 'asr', 'diarizing', 'caching')
+LANGUAGE_STAGES = ('translating', 'tts', 'apply_emotion', 'mixing')
+
+def format_seconds(seconds):
+    """Duración aproximada para mostrar al usuario"""
+    if seconds < 60:
+        return f"{max(1, int(round(seconds)))} s"
+    return f"{int(round(seconds / 60.0))} min"
+
+class CostModel:
+    """Segundos de proceso estimados para un video, aprendidos de los trabajos terminados
+
+    coste = fijo + duración * (rtf común + rtf por idioma * idiomas)
+
+    Los factores de tiempo real empiezan en los valores de config y se ajustan
+    con media móvil exponencial. Si el trabajo trae métricas por etapa, se usan
+    para repartir el tiempo entre la parte común y la de cada idioma; si no,
+    ambos factores se escalan por igual.
+    """
+
+    def __init__(self, path=COST_MODEL_PATH, smoothing=COST_SMOOTHING):
+        self.path = path
+        self.smoothing = smoothing
+        self.shared_rtf = COST_SHARED_RTF
+        self.language_rtf = COST_LANGUAGE_RTF
+        self.fixed = COST_FIXED_SECONDS
+        self.observed = 0
+        self.load()
+
+    def load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                saved = json.load(f)
+            self.shared_rtf = saved['shared_rtf']
+            self.language_rtf = saved['language_rtf']
+            self.observed = saved.get('observed', 0)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        partial = self.path + ".partial"
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump({'shared_rtf': self.shared_rtf, 'language_rtf': self.language_rtf, 'observed': self.observed}, f)
+        os.replace(partial, self.path)
+
+    def estimate(self, duration, languages):
+        """Segundos de worker que costará el trabajo"""
+        return self.fixed + (duration or 0.0) * (self.shared_rtf + self.language_rtf * max(1, languages))
+
+    def observe(self, duration, languages, seconds, report=None):
+        """Ajusta los factores con lo que tardó de verdad un trabajo"""
+        if not duration or seconds <= self.fixed:
+            return
+        languages = max(1, languages)
+        rtf = (seconds - self.fixed) / duration
+        shared_share = self.shared_rtf / (self.shared_rtf + self.language_rtf * languages)
+        if report:
+            # Reparto según el tiempo medido en cada grupo de etapas
+            stages = report.get('stages', {})
+            shared = sum(stages[name]['wall'] for name in SHARED_STAGES if name in stages)
+            per_language = sum(stages[name]['wall'] for name in LANGUAGE_STAGES if name in stages)
+            if shared + per_language > 0:
+                shared_share = shared / (shared + per_language)
+        alpha = self.smoothing
+        self.shared_rtf += alpha * (rtf * shared_share - self.shared_rtf)
+        self.language_rtf += alpha * (rtf * (1.0 - shared_share) / languages - self.language_rtf)
+        self.observed += 1
+        try:
+            self.save()
+        except OSError:
+            pass
+
+class FairScheduler:
+    """Reparte los workers entre chats según el coste estimado (cola justa ponderada)
+
+    Cada trabajo recibe una etiqueta de fin virtual: empieza donde terminó el
+    último trabajo de su chat (o en el tiempo virtual actual, si el chat no
+    tenía nada en cola) y dura su coste. Siempre arranca la etiqueta más baja,
+    así un chat con muchos videos no hace esperar a los demás más que uno de
+    sus trabajos. Se usa sólo desde el bucle de eventos del bot.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.waiting = []
+        self.running = []
+        self.virtual_time = 0.0
+        self.last_finish = {}
+        self.sequence = itertools.count()
+
+    def _ticket(self, chat_id, cost):
+        start = max(self.virtual_time, self.last_finish.get(chat_id, 0.0))
+        return {'chat_id': chat_id, 'cost': cost, 'start': start, 'finish': start + cost}
+
+    def estimate_wait(self, chat_id, cost):
+        """Segundos hasta que arrancaría un trabajo nuevo de este chat"""
+        new = self._ticket(chat_id, cost)
+        now = time.monotonic()
+        # Cuándo queda libre cada worker, y los trabajos que irían antes en orden de etiqueta
+        free_at = [max(0.0, ticket['cost'] - (now - ticket['started'])) for ticket in self.running]
+        free_at += [0.0] * (self.slots - len(free_at))
+        heapq.heapify(free_at)
+        for finish, _, ticket in sorted(self.waiting, key=lambda entry: entry[:2]):
+            if finish > new['finish']:
+                break
+            heapq.heappush(free_at, heapq.heappop(free_at) + ticket['cost'])
+        return free_at[0]
+
+    async def acquire(self, chat_id, cost):
+        """Espera el turno del trabajo; devuelve el ticket para release()"""
+        ticket = self._ticket(chat_id, cost)
+        ticket['future'] = asyncio.get_running_loop().create_future()
+        self.last_finish[chat_id] = ticket['finish']
+        heapq.heappush(self.waiting, (ticket['finish'], next(self.sequence), ticket))
+        self._dispatch()
+        try:
+            await ticket['future']
+        except asyncio.CancelledError:
+            if ticket in self.running:
+                self.release(ticket)
+            else:
+                self.waiting = [entry for entry in self.waiting if entry[2] is not ticket]
+                heapq.heapify(self.waiting)
+                # El chat no debe pagar en su próxima etiqueta un trabajo que no llegó a correr
+                own = [entry[2]['finish'] for entry in self.waiting if entry[2]['chat_id'] == chat_id]
+                own += [other['finish'] for other in self.running if other['chat_id'] == chat_id]
+                self.last_finish[chat_id] = max(own or [self.virtual_time])
+            raise
+        return ticket
+
+    def release(self, ticket):
+        if ticket in self.running:
+            self.running.remove(ticket)
+        # Los chats sin trabajos por delante del tiempo virtual ya no necesitan etiqueta
+        for chat_id in [chat_id for chat_id, finish in self.last_finish.items() if finish <= self.virtual_time]:
+            del self.last_finish[chat_id]
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.waiting and len(self.running) < self.slots:
+            _, _, ticket = heapq.heappop(self.waiting)
+            self.virtual_time = max(self.virtual_time, ticket['start'])
+            ticket['started'] = time.monotonic()
+            self.running.append(ticket)
+            ticket['future'].set_result(None)
+
+def check_admission(probe, pending, wait_seconds):
+    """Motivo para rechazar el trabajo, o None si se admite"""
+    if not probe['has_audio']:
+        return "El video no tiene audio que doblar"
+    if probe['duration'] <= 0:
+        return "No se pudo determinar la duración del video"
+    if probe['duration'] > ADMISSION_MAX_DURATION_SECONDS:
+        return (f"El video dura {format_seconds(probe['duration'])}; "
+                f"el máximo es {format_seconds(ADMISSION_MAX_DURATION_SECONDS)}")
+    if pending >= ADMISSION_MAX_PENDING_PER_CHAT:
+        return f"Ya tienes {pending} video(s) en proceso; espera a que terminen"
+    if wait_seconds > ADMISSION_MAX_WAIT_SECONDS:
+        return f"El bot está saturado (espera estimada {format_seconds(wait_seconds)}); inténtalo más tarde"
+    return None
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from config import ARTIFACT_CACHE_DIR, ARTIFACT_CACHE_MAX_MB, DEMUCS_MODEL, ASR_BACKEND, ASR_MODEL_SIZE
+
+# Cambiar al modificar el formato o los modelos que generan los artefactos
+CACHE_VERSION = 6
+META_FILE = "meta.json"
+
+class ArtifactCache:
+    """Caché en disco de los resultados que no dependen del idioma destino
+
+    Las entradas se indexan por el hash del contenido del video y se expulsan
+    por LRU cuando el tamaño total supera el límite.
+    """
+
+    def __init__(self, root=ARTIFACT_CACHE_DIR, max_mb=ARTIFACT_CACHE_MAX_MB):
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        os.makedirs(self.root, exist_ok=True)
+
+    def content_key(self, path):
+        """Hash del contenido del archivo más la versión del pipeline"""
+        digest = hashlib.sha256()
+        digest.update(f"v{CACHE_VERSION}:{DEMUCS_MODEL}:{ASR_BACKEND}:{ASR_MODEL_SIZE}:".encode())
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def get(self, key):
+        """Devuelve {'meta': ..., 'files': {nombre: ruta}} o None"""
+        entry = self._entry_dir(key)
+        meta_path = os.path.join(entry, META_FILE)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        files = {name: os.path.join(entry, filename) for name, filename in meta.get('files', {}).items()}
+        if not all(os.path.exists(path) for path in files.values()):
+            return None
+
+        # Marcar como usado recientemente
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return {'meta': meta.get('data', {}), 'files': files}
+
+    def put(self, key, files, data):
+        """Guarda los archivos (nombre -> ruta origen) y los metadatos de una entrada"""
+        entry = self._entry_dir(key)
+        if os.path.exists(os.path.join(entry, META_FILE)):
+            return
+
+        staging = tempfile.mkdtemp(prefix=".staging_", dir=self.root)
+        try:
+            stored = {}
+            for name, source in files.items():
+                filename = name + os.path.splitext(source)[1]
+                shutil.copyfile(source, os.path.join(staging, filename))
+                stored[name] = filename
+            with open(os.path.join(staging, META_FILE), 'w', encoding='utf-8') as f:
+                json.dump({'files': stored, 'data': data, 'created': time.time()}, f, ensure_ascii=False)
+            # Publicar la entrada completa de una sola vez
+            os.replace(staging, entry)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.exists(os.path.join(entry, META_FILE)):
+                raise
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.root):
+            entry = os.path.join(self.root, name)
+            meta_path = os.path.join(entry, META_FILE)
+            if name.startswith('.') or not os.path.exists(meta_path):
+                continue
+            try:
+                size = sum(
+                    os.path.getsize(os.path.join(dirpath, filename))
+                    for dirpath, _, filenames in os.walk(entry)
+                    for filename in filenames
+                )
+                entries.append((os.path.getmtime(meta_path), size, entry))
+            except OSError:
+                continue
+        return entries
+
+    def evict(self):
+        """Borra las entradas menos usadas hasta cumplir el límite de tamaño"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,59 @@
+import os
+from config import ASR_BACKEND, ASR_MODEL_SIZE, ASR_COMPUTE_TYPE, NUM_WORKERS
+
+class WhisperBackend:
+    """Whisper de OpenAI (PyTorch); en CPU trabaja en float32"""
+
+    name = "whisper"
+
+    def __init__(self, model_size=ASR_MODEL_SIZE, device="cpu", compute_type=None):
+        import whisper
+        self.device = device
+        self.model = whisper.load_model(model_size, device=device)
+
+    def transcribe(self, samples, language=None):
+        """Transcribe float32 mono a 16 kHz; devuelve {'language', 'segments'}"""
+        result = self.model.transcribe(samples, language=language, fp16=(self.device == "cuda"))
+        segments = [
+            {'start': float(segment['start']), 'end': float(segment['end']), 'text': segment['text']}
+            for segment in result.get('segments', [])
+        ]
+        return {'language': result['language'], 'segments': segments}
+
+class FasterWhisperBackend:
+    """Los mismos modelos de Whisper sobre CTranslate2, cuantizados (int8 en CPU)"""
+
+    name = "faster-whisper"
+
+    def __init__(self, model_size=ASR_MODEL_SIZE, device="cpu", compute_type=ASR_COMPUTE_TYPE):
+        from faster_whisper import WhisperModel
+        # Repartir los núcleos entre los workers que comparten la máquina
+        cpu_threads = max(1, (os.cpu_count() or 1) // max(1, NUM_WORKERS))
+        self.model = WhisperModel(model_size, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+
+    def transcribe(self, samples, language=None):
+        """Transcribe float32 mono a 16 kHz; devuelve {'language', 'segments'}"""
+        segments, info = self.model.transcribe(samples, language=language)
+        # segments es un generador: la transcripción ocurre al recorrerlo
+        segments = [
+            {'start': float(segment.start), 'end': float(segment.end), 'text': segment.text}
+            for segment in segments
+        ]
+        return {'language': info.language, 'segments': segments}
+
+ASR_BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+def create_asr_backend(name=ASR_BACKEND, model_size=ASR_MODEL_SIZE, device="cpu", compute_type=ASR_COMPUTE_TYPE):
+    """Crea el backend de transcripción configurado, con Whisper como respaldo"""
+    if name not in ASR_BACKENDS:
+        raise ValueError(f"Backend de transcripción desconocido: {name}")
+    try:
+        return ASR_BACKENDS[name](model_size, device, compute_type)
+    except ImportError as e:
+        if name == WhisperBackend.name:
+            raise
+        print(f"⚠️ {name} no disponible ({e}), se usará Whisper")
+        return WhisperBackend(model_size, device)
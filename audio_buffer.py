@@ -0,0 +1,76 @@
+from math import gcd
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+class AudioBuffer:
+    """Audio decodificado una sola vez (float32) con vistas remuestreadas en caché"""
+
+    def __init__(self, samples, rate, path=None):
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        # Siempre (frames, canales)
+        self.samples = samples
+        self.rate = int(rate)
+        self.path = path
+        self._views = {}
+
+    @classmethod
+    def from_file(cls, path):
+        data, rate = sf.read(path, dtype='float32', always_2d=True)
+        return cls(data, rate, path=path)
+
+    @classmethod
+    def load(cls, source):
+        """Acepta un AudioBuffer o una ruta y devuelve siempre un AudioBuffer"""
+        if isinstance(source, AudioBuffer):
+            return source
+        return cls.from_file(source)
+
+    @property
+    def channels(self):
+        return self.samples.shape[1]
+
+    @property
+    def frames(self):
+        return self.samples.shape[0]
+
+    @property
+    def duration(self):
+        return self.frames / float(self.rate)
+
+    def view(self, rate=None, mono=False):
+        """Devuelve el audio a la frecuencia pedida, mono (1D) o (frames, canales)"""
+        rate = int(rate or self.rate)
+        key = (rate, mono)
+        if key in self._views:
+            return self._views[key]
+
+        if mono:
+            if rate == self.rate:
+                data = self.samples[:, 0] if self.channels == 1 else self.samples.mean(axis=1, dtype=np.float32)
+            else:
+                data = self.view(self.rate, mono=True)
+        else:
+            data = self.samples
+
+        if rate != self.rate:
+            factor = gcd(rate, self.rate)
+            data = resample_poly(data, rate // factor, self.rate // factor, axis=0).astype(np.float32, copy=False)
+
+        self._views[key] = data
+        return data
+
+    def add_view(self, data, rate, mono=False):
+        """Registra una vista ya calculada (p. ej. decodificada aparte por ffmpeg)"""
+        self._views[(int(rate), mono)] = np.asarray(data, dtype=np.float32)
+
+    def mono(self, rate=None):
+        return self.view(rate, mono=True)
+
+    def write(self, path):
+        """Guarda el audio en disco y recuerda la ruta"""
+        sf.write(path, self.samples, self.rate)
+        self.path = path
+        return path
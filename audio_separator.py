@@ -1,121 +1,249 @@
-import subprocess
 import os
 import noisereduce as nr
 import soundfile as sf
 import numpy as np
+from scipy.ndimage import minimum_filter1d, uniform_filter1d
+from audio_buffer import AudioBuffer
+from timeline import Timeline
+from model_registry import models as default_models
+from config import VAD_WINDOW_SECONDS, VAD_PAD_SECONDS, VAD_MIN_GAP_SECONDS, VAD_MIN_SPEECH_SECONDS, VAD_ENERGY_FLOOR
+from config import MIX_BLOCK_SIZE, MIX_HOP, MIX_CEILING, MIX_LOOKAHEAD_HOPS
+from config import PIPELINE_CHUNK_SECONDS, PIPELINE_SEARCH_SECONDS
 
 class AudioSeparator:
-    def __init__(self):
+    def __init__(self, models=None):
+        self.models = models or default_models
         self.demucs_available = True
+        self.engine = None
     
-    def separate_vocals_background(self, audio_path, output_dir):
-        """Separa voces del fondo usando Demucs"""
+    def get_engine(self):
+        """Carga Demucs una sola vez por worker"""
+        if self.engine is None and self.demucs_available:
+            try:
+                self.engine = self.models.get('demucs')
+            except Exception as e:
+                print(f"⚠️ Demucs no disponible, se usará extracción simple: {e}")
+                self.demucs_available = False
+        return self.engine
+    
+    def separate_vocals_background(self, audio, output_dir=None, progress_callback=None):
+        """Separa voces del fondo usando Demucs (guarda los stems si se da output_dir)"""
         print("🎵 Separando voces del audio de fondo...")
         
-        # Usar Demucs para separación profesional
-        cmd = [
-            'demucs',
-            '--two-stems=vocals',
-            '-n', 'htdemucs',
-            '--out', output_dir,
-            audio_path
-        ]
-        
-        try:
-            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-            
-            # Encontrar archivos generados
-            audio_name = os.path.splitext(os.path.basename(audio_path))[0]
-            vocals_path = os.path.join(output_dir, 'htdemucs', audio_name, 'vocals.wav')
-            background_path = os.path.join(output_dir, 'htdemucs', audio_name, 'no_vocals.wav')
-            
-            if os.path.exists(vocals_path) and os.path.exists(background_path):
-                return vocals_path, background_path
-        except:
-            pass
+        audio = AudioBuffer.load(audio)
+        engine = self.get_engine()
+        
+        if engine is not None:
+            try:
+                vocals, background = engine.separate(audio, progress_callback)
+                
+                vocals = AudioBuffer(vocals.T, engine.rate)
+                background = AudioBuffer(background.T, engine.rate)
+                if output_dir is not None:
+                    vocals.write(os.path.join(output_dir, 'vocals.wav'))
+                    background.write(os.path.join(output_dir, 'no_vocals.wav'))
+                return vocals, background
+            except Exception as e:
+                print(f"⚠️ Error en Demucs, se usará extracción simple: {e}")
         
         # Fallback: reducción de ruido simple
-        return self.simple_vocal_extraction(audio_path, output_dir)
+        return self.simple_vocal_extraction(audio, output_dir)
     
-    def simple_vocal_extraction(self, audio_path, output_dir):
+    def simple_vocal_extraction(self, audio, output_dir=None):
         """Extracción simple de voces usando reducción de ruido"""
         print("🎵 Usando extracción simple de voces...")
         
-        data, rate = sf.read(audio_path)
+        audio = AudioBuffer.load(audio)
+        data, rate = audio.mono(), audio.rate
         
         # Reducir ruido de fondo
-        reduced_noise = nr.reduce_noise(y=data, sr=rate, prop_decrease=0.8)
+        reduced_noise = nr.reduce_noise(y=data, sr=rate, prop_decrease=0.8).astype(np.float32)
         
-        vocals_path = os.path.join(output_dir, 'vocals_simple.wav')
-        sf.write(vocals_path, reduced_noise, rate)
+        vocals = AudioBuffer(reduced_noise, rate)
         
         # Crear audio de fondo (original - voces)
-        background = data - reduced_noise
-        background_path = os.path.join(output_dir, 'background_simple.wav')
-        sf.write(background_path, background, rate)
+        background = AudioBuffer(data - reduced_noise, rate)
+        if output_dir is not None:
+            vocals.write(os.path.join(output_dir, 'vocals_simple.wav'))
+            background.write(os.path.join(output_dir, 'background_simple.wav'))
         
-        return vocals_path, background_path
+        return vocals, background
     
-    def detect_speakers(self, audio_path):
-        """Detecta número de hablantes en el audio"""
-        print("👥 Detectando número de hablantes...")
-        
-        # Análisis simple basado en energía y pausas
-        data, rate = sf.read(audio_path)
-        
-        # Convertir a mono si es estéreo
-        if len(data.shape) > 1:
-            data = np.mean(data, axis=1)
-        
-        # Calcular energía en ventanas
-        window_size = int(rate * 0.5)  # 500ms
+    def frame_energy(self, data, window_size, hop_size):
+        """RMS de cada ventana en una sola pasada, con vistas por stride (sin copias)"""
+        if len(data) < window_size:
+            return np.zeros(0, dtype=np.float32)
+        frames = np.lib.stride_tricks.sliding_window_view(data, window_size)[::hop_size]
+        return np.sqrt(np.einsum('ij,ij->i', frames, frames) / window_size).astype(np.float32)
+    
+    def stream_energy(self, audio_path, window_size, hop_size, frames_per_block=512):
+        """Igual que frame_energy pero leyendo el archivo por bloques (memoria constante)"""
+        # Bloques solapados de forma que las ventanas queden alineadas entre bloques
+        blocksize = window_size + hop_size * (frames_per_block - 1)
         energy = []
+        for block in sf.blocks(audio_path, blocksize=blocksize, overlap=window_size - hop_size,
+                               dtype='float32', always_2d=True):
+            mono = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1)
+            energy.append(self.frame_energy(mono, window_size, hop_size)[:frames_per_block])
+        return np.concatenate(energy) if energy else np.zeros(0, dtype=np.float32)
+    
+    def analyze_activity(self, audio, window_seconds=0.5, threshold_ratio=0.3, energy_floor=0.0):
+        """Energía por ventana y tramos con actividad
+        
+        Con un AudioBuffer trabaja en memoria; con una ruta lee el archivo por bloques.
+        Devuelve {'energy', 'active', 'hop_seconds', 'segments'}.
+        """
+        if isinstance(audio, AudioBuffer):
+            rate = audio.rate
+            window_size = int(rate * window_seconds)
+            hop_size = window_size // 2
+            energy = self.frame_energy(audio.mono(), window_size, hop_size)
+        else:
+            rate = sf.info(audio).samplerate
+            window_size = int(rate * window_seconds)
+            hop_size = window_size // 2
+            energy = self.stream_energy(audio, window_size, hop_size)
+        
+        threshold = max(np.mean(energy) * threshold_ratio, energy_floor) if len(energy) else 0.0
+        active = energy > threshold
+        return {
+            'energy': energy,
+            'active': active,
+            'hop_seconds': hop_size / rate,
+            'segments': self.activity_segments(active, hop_size / rate, window_size / rate),
+        }
+    
+    def speech_regions(self, vocals, window_seconds=VAD_WINDOW_SECONDS, pad_seconds=VAD_PAD_SECONDS,
+                       min_gap_seconds=VAD_MIN_GAP_SECONDS, min_speech_seconds=VAD_MIN_SPEECH_SECONDS):
+        """Tramos con voz en el stem de voces (VAD por energía), con margen y unidos si están cerca"""
+        activity = self.analyze_activity(vocals, window_seconds, energy_floor=VAD_ENERGY_FLOOR)
+        duration = vocals.duration if isinstance(vocals, AudioBuffer) else sf.info(vocals).duration
+        
+        regions = []
+        for start, end in activity['segments']:
+            start = max(0.0, start - pad_seconds)
+            end = min(duration, end + pad_seconds)
+            if regions and start - regions[-1][1] < min_gap_seconds:
+                regions[-1] = (regions[-1][0], end)
+            else:
+                regions.append((start, end))
+        
+        regions = [(start, end) for start, end in regions if end - start >= min_speech_seconds]
+        speech = sum(end - start for start, end in regions)
+        print(f"🗣️ Voz en {len(regions)} tramo(s): {speech:.1f}s de {duration:.1f}s")
+        return regions
+    
+    def activity_segments(self, active, hop_seconds, window_seconds):
+        """Convierte las ventanas activas consecutivas en tramos (inicio, fin) en segundos"""
+        if not len(active):
+            return []
+        padded = np.concatenate([[False], active, [False]]).astype(np.int8)
+        edges = np.diff(padded)
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1) - 1
+        return [
+            (float(start * hop_seconds), float(end * hop_seconds + window_seconds))
+            for start, end in zip(starts, ends)
+        ]
+    
+    def chunk_boundaries(self, activity, duration, chunk_seconds=PIPELINE_CHUNK_SECONDS, search_seconds=PIPELINE_SEARCH_SECONDS):
+        """Parte el audio en tramos de ~chunk_seconds cortando en la ventana más silenciosa
+        
+        activity es lo que devuelve analyze_activity; así los cortes caen entre frases.
+        Devuelve [(inicio, fin)] en segundos.
+        """
+        energy, hop = activity['energy'], activity['hop_seconds']
+        bounds = [0.0]
+        # El último tramo absorbe el resto si es corto, para no crear tramos mínimos
+        while duration - bounds[-1] > chunk_seconds * 1.5:
+            target = bounds[-1] + chunk_seconds
+            first = max(0, int((target - search_seconds) / hop))
+            window = energy[first:int((target + search_seconds) / hop) + 1]
+            # Centro de la ventana de análisis con menos energía
+            cut = (first + int(np.argmin(window))) * hop + hop if len(window) else target
+            bounds.append(min(max(cut, bounds[-1] + hop), duration))
+        bounds.append(duration)
+        return list(zip(bounds[:-1], bounds[1:]))
+    
+    def _open_background(self, background, rate):
+        """Devuelve (canales, leer(inicio, fin), cerrar) para el fondo a la frecuencia de la mezcla"""
+        if not isinstance(background, AudioBuffer) and sf.info(background).samplerate == rate:
+            # Archivo a la misma frecuencia: se lee por bloques sin cargarlo entero
+            handle = sf.SoundFile(background)
+            
+            def read(start, end):
+                handle.seek(min(start, handle.frames))
+                return handle.read(end - start, dtype='float32', always_2d=True)
+            return handle.channels, read, handle.close
         
-        for i in range(0, len(data) - window_size, window_size // 2):
-            window = data[i:i + window_size]
-            energy.append(np.sqrt(np.mean(window ** 2)))
+        data = AudioBuffer.load(background).view(rate)
+        return data.shape[1], lambda start, end: data[start:end], lambda: None
+    
+    def limiter_gain(self, peaks, ceiling=MIX_CEILING, lookahead=MIX_LOOKAHEAD_HOPS):
+        """Ganancia por tramo que deja cada pico bajo el techo, con anticipación y sin saltos"""
+        required = np.minimum(1.0, ceiling / np.maximum(peaks, 1e-9))
+        size = 2 * lookahead + 1
+        # El mínimo en la ventana baja la ganancia antes del pico; la media la suaviza.
+        # Un tramo más por lado cubre la interpolación entre centros de tramo.
+        gain = minimum_filter1d(required, size=size + 2, mode='nearest')
+        return uniform_filter1d(gain, size=size, mode='nearest')
+    
+    def mix_audio(self, vocals, background, output, background_volume=0.5, block_size=MIX_BLOCK_SIZE, hop=MIX_HOP):
+        """Mezcla por bloques las voces dobladas con el fondo (estéreo si el fondo lo es)
+        
+        vocals puede ser un Timeline o un audio; background puede ser None. output es
+        una ruta o una fábrica output(rate, channels) que devuelve un escritor con
+        write(), por ejemplo ffmpeg_io.mux_writer. Primera pasada: picos por tramo
+        para el limitador. Segunda: mezcla con la ganancia.
+        """
+        if background is not None:
+            print(f"🎚️ Mezclando audio (fondo al {int(background_volume*100)}%)...")
+        
+        if isinstance(vocals, Timeline):
+            rate, length, render_vocals = vocals.rate, vocals.length, vocals.render
+        else:
+            vocals = AudioBuffer.load(vocals)
+            data = vocals.mono()
+            rate, length = vocals.rate, len(data)
+            render_vocals = lambda start, end: data[start:end]
         
-        # Detectar cambios significativos (posibles cambios de hablante)
-        energy = np.array(energy)
-        threshold = np.mean(energy) * 0.3
+        if background is not None:
+            channels, read_background, close_background = self._open_background(background, rate)
+        else:
+            channels, read_background, close_background = 1, None, lambda: None
         
-        active_segments = energy > threshold
-        changes = np.diff(active_segments.astype(int))
-        num_changes = np.sum(np.abs(changes))
+        def render(start, end):
+            block = np.zeros((end - start, channels), dtype=np.float32)
+            if read_background is not None:
+                stem = read_background(start, end)
+                block[:len(stem)] = stem[:, :channels] * background_volume
+            block += render_vocals(start, end)[:, np.newaxis]
+            return block
         
-        # Estimar número de hablantes
-        if num_changes < 5:
-            return 1
-        elif num_changes < 15:
-            return 2
-        else:
-            return 3  # 3 o más
-    
-    def mix_audio(self, vocals_path, background_path, output_path, background_volume=0.5):
-        """Mezcla voces dobladas con audio de fondo"""
-        print(f"🎚️ Mezclando audio (fondo al {int(background_volume*100)}%)...")
-        
-        vocals, rate = sf.read(vocals_path)
-        background, _ = sf.read(background_path)
-        
-        # Convertir a mono si es necesario
-        if len(vocals.shape) > 1:
-            vocals = np.mean(vocals, axis=1)
-        if len(background.shape) > 1:
-            background = np.mean(background, axis=1)
-        
-        # Ajustar longitudes
-        min_len = min(len(vocals), len(background))
-        vocals = vocals[:min_len]
-        background = background[:min_len]
-        
-        # Mezclar con volumen ajustado
-        mixed = vocals + (background * background_volume)
-        
-        # Normalizar
-        max_val = np.max(np.abs(mixed))
-        if max_val > 0:
-            mixed = mixed / max_val * 0.95
-        
-        sf.write(output_path, mixed, rate)
-        return output_path
+        block_size = max(hop, block_size // hop * hop)
+        try:
+            # Primera pasada: pico por tramo de `hop` muestras
+            peaks = np.zeros(-(-length // hop), dtype=np.float32)
+            for start in range(0, length, block_size):
+                end = min(start + block_size, length)
+                block_peaks = np.abs(render(start, end)).max(axis=1)
+                block_peaks = np.pad(block_peaks, (0, -len(block_peaks) % hop))
+                peaks[start // hop:start // hop + len(block_peaks) // hop] = block_peaks.reshape(-1, hop).max(axis=1)
+            
+            gain = self.limiter_gain(peaks)
+            centers = np.arange(len(gain)) * hop + hop / 2.0
+            
+            # Segunda pasada: mezclar, aplicar la ganancia y escribir
+            if callable(output):
+                writer = output(rate, channels)
+            else:
+                writer = sf.SoundFile(output, 'w', samplerate=rate, channels=channels)
+            with writer as out:
+                for start in range(0, length, block_size):
+                    end = min(start + block_size, length)
+                    block_gain = np.interp(np.arange(start, end), centers, gain).astype(np.float32)
+                    out.write(render(start, end) * block_gain[:, np.newaxis])
+        finally:
+            close_background()
+        
+        return output
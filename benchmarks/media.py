@@ -0,0 +1,32 @@
+import os
+import subprocess
+
+def generate_video(path, duration, rate=44100, size="320x240"):
+    """Genera con ffmpeg (lavfi) un video sintético de `duration` segundos
+
+    El audio mezcla un fondo tonal, ruido rosa y ráfagas con aspecto de voz:
+    un tono armónico con vibrato, modulado a ritmo de sílabas y con pausas
+    entre frases. Las frases alternan dos tonos fundamentales (dos "hablantes").
+    """
+    if os.path.exists(path):
+        return path
+    # f0 de cada "hablante", vibrato lento y sílabas a ~4 Hz; silencio entre frases de 3.2 s
+    f0 = "if(lt(mod(t\\,6.4)\\,3.2)\\,120\\,210)*(1+0.03*sin(2*PI*5*t))"
+    voice = (
+        f"0.25*(sin(2*PI*{f0}*t)+0.5*sin(4*PI*{f0}*t)+0.25*sin(6*PI*{f0}*t))"
+        "*(0.55+0.45*sin(2*PI*4*t))*gt(mod(t\\,3.2)\\,0.9)"
+    )
+    command = [
+        'ffmpeg', '-nostdin', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f"testsrc2=size={size}:rate=25:duration={duration}",
+        '-f', 'lavfi', '-i', f"sine=frequency=110:sample_rate={rate}:duration={duration}",
+        '-f', 'lavfi', '-i', f"anoisesrc=color=pink:amplitude=0.03:sample_rate={rate}:duration={duration}",
+        '-f', 'lavfi', '-i', f"aevalsrc='{voice}':s={rate}:d={duration}",
+        '-filter_complex',
+        "[1:a]volume=0.2[bed];[bed][2:a][3:a]amix=inputs=3:normalize=0,aformat=channel_layouts=stereo[a]",
+        '-map', '0:v', '-map', '[a]', '-c:v', 'mpeg4', '-q:v', '10', '-c:a', 'aac', '-shortest', path,
+    ]
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg no pudo generar {path}: {result.stderr.decode('utf-8', errors='replace').strip()}")
+    return path
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Benchmarks del pipeline de doblaje con videos sintéticos
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.run --durations 30 120 --output bench.json
+    python -m benchmarks.run --durations 30 --baseline bench.json
+    python -m benchmarks.run --compare antes.json despues.json
+
+Por defecto usa modelos falsos (sin GPU ni descargas); --models real carga
+los configurados. Cada etapa reporta tiempo de pared, CPU del proceso y pico
+de memoria; las etapas anidadas o en paralelo se solapan en esas cifras.
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from benchmarks.media import generate_video
+from metrics import peak_rss_bytes, reset_peak_rss
+
+# Etapas de process_video que se miden: (objeto, método) -> nombre de la etapa
+PROCESSOR_STAGES = [
+    ('processor', 'extract_audio', 'extracting'),
+    ('processor', 'detect_activity', 'detecting'),
+    ('separator', 'separate_vocals_background', 'separating'),
+    ('emotion', 'extract_features', 'emotion'),
+    ('processor', 'transcribe_audio', 'transcribing'),
+    ('diarizer', 'diarize', 'diarizing'),
+    ('processor', 'dub_in_chunks', 'chunked'),
+    ('processor', 'translate_languages', 'translating'),
+    ('processor', 'synthesize_segments', 'cloning'),
+    ('processor', 'finish_language', 'mixing'),
+    ('processor', 'store_source', 'caching'),
+]
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+class StageMeter:
+    """Acumula llamadas, tiempo de pared, CPU y pico de memoria por etapa"""
+
+    def __init__(self):
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.active = 0
+
+    @contextmanager
+    def measure(self, name):
+        with self.lock:
+            # Sólo se reinicia el pico si no hay otra etapa midiendo
+            if self.active == 0:
+                reset_peak_rss()
+            self.active += 1
+        wall, cpu = time.perf_counter(), cpu_seconds()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, cpu_seconds() - cpu
+            with self.lock:
+                self.active -= 1
+                stage = self.stages.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'peak_rss_mb': 0.0})
+                stage['calls'] += 1
+                stage['wall'] += wall
+                stage['cpu'] += cpu
+                stage['peak_rss_mb'] = max(stage['peak_rss_mb'], peak_rss_bytes() / (1024.0 * 1024.0))
+
+    def wrap(self, target, method, name):
+        """Sustituye target.method por una versión medida"""
+        original = getattr(target, method)
+
+        @functools.wraps(original)
+        def measured(*args, **kwargs):
+            with self.measure(name):
+                return original(*args, **kwargs)
+        setattr(target, method, measured)
+
+def load_processor(model_kind, translate_latency):
+    if model_kind == 'stub':
+        from benchmarks.stubs import install_stub_models, stub_translation
+        install_stub_models()
+    from video_processor import VideoProcessor
+    processor = VideoProcessor()
+    if model_kind == 'stub':
+        stub_translation(processor, translate_latency)
+    return processor
+
+def run_end_to_end(processor, video_path, duration, target_langs, keep_background, workdir):
+    """Un process_video_multi completo, con caché de artefactos vacía"""
+    from artifact_cache import ArtifactCache
+    processor.artifact_cache = ArtifactCache(tempfile.mkdtemp(prefix="cache_", dir=workdir))
+    meter = StageMeter()
+    targets = {
+        'processor': processor,
+        'separator': processor.audio_separator,
+        'emotion': processor.emotion_detector,
+        'diarizer': processor.diarizer,
+    }
+    originals = []
+    for owner, method, name in PROCESSOR_STAGES:
+        originals.append((targets[owner], method))
+        meter.wrap(targets[owner], method, name)
+
+    outputs = {lang: os.path.join(workdir, f"out_{lang}.mp4") for lang in target_langs}
+    try:
+        with meter.measure('total'):
+            processor.process_video_multi(video_path, outputs, keep_background)
+    finally:
+        # Quitar los envoltorios de instancia para la siguiente repetición
+        for owner, method in originals:
+            owner.__dict__.pop(method, None)
+    return meter.stages
+
+def run_components(processor, video_path, workdir):
+    """Cada método de AudioSeparator, EmotionDetector y la diarización por separado"""
+    from audio_buffer import AudioBuffer
+    from timeline import Timeline
+    separator, emotion, diarizer = processor.audio_separator, processor.emotion_detector, processor.diarizer
+    meter = StageMeter()
+
+    with meter.measure('decode'):
+        audio = processor.extract_audio(video_path)
+    analysis = AudioBuffer(audio.mono(16000), 16000)
+    with meter.measure('analyze_activity'):
+        activity = separator.analyze_activity(analysis)
+    with meter.measure('chunk_boundaries'):
+        separator.chunk_boundaries(activity, audio.duration)
+    with meter.measure('separate_vocals_background'):
+        vocals, background = separator.separate_vocals_background(audio)
+    with meter.measure('speech_regions'):
+        regions = separator.speech_regions(vocals)
+    with meter.measure('extract_features'):
+        features = emotion.extract_features(vocals)
+    with meter.measure('analyze_emotion'):
+        emotion.analyze_emotion(vocals, features)
+
+    segments = [{'start': start, 'end': end, 'text': ''} for start, end in regions]
+    with meter.measure('label_segments'):
+        emotion.label_segments(features, segments)
+    with meter.measure('diarize'):
+        diarizer.diarize(vocals, segments)
+
+    clip = os.path.join(workdir, "clip.wav")
+    AudioBuffer(vocals.mono()[:vocals.rate * 3], vocals.rate).write(clip)
+    with meter.measure('apply_emotion_to_audio'):
+        emotion.apply_emotion_to_audio(clip, os.path.join(workdir, "clip_happy.wav"), emotion.emotions['happy'])
+
+    clips = [(segment['start'], clip) for segment in segments]
+    with meter.measure('mix_audio'):
+        separator.mix_audio(Timeline(clips, audio.rate, audio.duration), background, os.path.join(workdir, "mix.wav"))
+    return meter.stages
+
+def merge_repeats(runs):
+    """Mediana de tiempos y máximo de memoria entre repeticiones"""
+    merged = {}
+    for name in runs[0]:
+        values = [run[name] for run in runs if name in run]
+        merged[name] = {
+            'calls': values[0]['calls'],
+            'wall': round(statistics.median(value['wall'] for value in values), 4),
+            'cpu': round(statistics.median(value['cpu'] for value in values), 4),
+            'peak_rss_mb': round(max(value['peak_rss_mb'] for value in values), 1),
+        }
+    return merged
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+def compare(baseline, current, tolerance, min_seconds):
+    """Etapas más lentas que en baseline en más de `tolerance` (y de min_seconds)"""
+    old_cases = {case['case']: case for case in baseline['results']}
+    regressions = []
+    print(f"{'caso':<22} {'etapa':<28} {'antes':>9} {'ahora':>9} {'cambio':>8}")
+    for case in current['results']:
+        old = old_cases.get(case['case'])
+        if old is None:
+            continue
+        for name, stage in case['stages'].items():
+            if name not in old['stages']:
+                continue
+            before, after = old['stages'][name]['wall'], stage['wall']
+            change = (after - before) / before if before > 0 else 0.0
+            regressed = change > tolerance and after - before > min_seconds
+            flag = "  ⚠️" if regressed else ""
+            print(f"{case['case']:<22} {name:<28} {before:>8.3f}s {after:>8.3f}s {change:>+7.1%}{flag}")
+            if regressed:
+                regressions.append((case['case'], name, before, after))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline de doblaje")
+    parser.add_argument('--durations', type=float, nargs='+', default=[30.0], help="segundos de cada video sintético")
+    parser.add_argument('--languages', nargs='+', default=['es'])
+    parser.add_argument('--models', choices=['stub', 'real'], default='stub')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-background', action='store_true')
+    parser.add_argument('--translate-latency', type=float, default=0.0, help="latencia simulada por petición de traducción (modelos falsos)")
+    parser.add_argument('--skip-components', action='store_true')
+    parser.add_argument('--media-dir', default=os.path.join(tempfile.gettempdir(), "dub_bench_media"))
+    parser.add_argument('--output', help="guardar resultados en JSON")
+    parser.add_argument('--baseline', help="resultados anteriores con los que comparar")
+    parser.add_argument('--compare', nargs=2, metavar=('ANTES', 'AHORA'), help="sólo comparar dos archivos")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="aumento relativo que cuenta como regresión")
+    parser.add_argument('--min-seconds', type=float, default=0.05, help="diferencia absoluta mínima para avisar")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        return 1 if compare(baseline, current, args.tolerance, args.min_seconds) else 0
+
+    os.makedirs(args.media_dir, exist_ok=True)
+    processor = load_processor(args.models, args.translate_latency)
+    results = []
+    for duration in args.durations:
+        video_path = generate_video(os.path.join(args.media_dir, f"synthetic_{duration:g}s.mp4"), duration)
+        cases = [('e2e', lambda workdir: run_end_to_end(
+            processor, video_path, duration, args.languages, not args.no_background, workdir))]
+        if not args.skip_components:
+            cases.append(('components', lambda workdir: run_components(processor, video_path, workdir)))
+
+        for kind, run in cases:
+            runs = []
+            for _ in range(max(1, args.repeat)):
+                with tempfile.TemporaryDirectory(prefix="dub_bench_") as workdir:
+                    runs.append(run(workdir))
+            stages = merge_repeats(runs)
+            case = {'case': f"{kind}_{duration:g}s", 'duration': duration, 'stages': stages}
+            if 'total' in stages:
+                case['rtf'] = round(stages['total']['wall'] / duration, 4)
+            results.append(case)
+            print(f"📊 {case['case']}: " + ", ".join(f"{name} {stage['wall']:.2f}s" for name, stage in stages.items()))
+
+    report = {'meta': dict(environment(), models=args.models, languages=args.languages, repeat=args.repeat),
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Resultados en {args.output}")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.tolerance, args.min_seconds):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
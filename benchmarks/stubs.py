@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy.signal import butter, sosfiltfilt
+from model_registry import models
+from translation import TranslationService, OfflineBackend
+
+class StubASR:
+    """Transcripción falsa: una frase cada ~2.5 s de audio con voz"""
+
+    name = "stub"
+
+    def transcribe(self, samples, language=None):
+        rate = 16000
+        duration = len(samples) / float(rate)
+        segments = []
+        start = 0.0
+        while start < duration - 0.5:
+            end = min(duration, start + 2.5)
+            segments.append({'start': start, 'end': end, 'text': " palabra" * int(2 + (end - start) * 2)})
+            start = end
+        return {'language': language or 'en', 'segments': segments}
+
+class StubDemucs:
+    """Separación falsa por bandas: la banda de voz (300-3400 Hz) y el resto"""
+
+    rate = 44100
+    channels = 2
+
+    def __init__(self):
+        self.sos = butter(4, [300, 3400], btype='bandpass', fs=self.rate, output='sos')
+
+    def separate(self, audio, progress_callback=None):
+        mix = np.ascontiguousarray(audio.view(self.rate).T)
+        if mix.shape[0] < self.channels:
+            mix = np.repeat(mix[:1], self.channels, axis=0)
+        vocals = sosfiltfilt(self.sos, mix, axis=1).astype(np.float32)
+        if progress_callback:
+            progress_callback(1, 1)
+        return vocals, (mix - vocals).astype(np.float32)
+
+class StubTTS:
+    """Síntesis falsa: tono armónico de ~60 ms por carácter, con la interfaz de XTTSEngine"""
+
+    rate = 24000
+
+    def __init__(self, workers=2):
+        self.workers = workers
+
+    def conditioning(self, reference_audio, speaker_key=None):
+        return None
+
+    def forget(self, speaker_key):
+        pass
+
+    def synthesize(self, text, language, reference_audio, speed=1.0, speaker_key=None):
+        t = np.arange(int(self.rate * 0.06 * len(text) / speed)) / float(self.rate)
+        return (0.3 * np.sin(2 * np.pi * 150 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))).astype(np.float32)
+
+    def map(self, function, items):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(function, items))
+
+def install_stub_models():
+    """Pone los modelos falsos en el registro para que nada pesado se cargue"""
+    models._device = "cpu"
+    models._models.update({'asr': StubASR(), 'tts': StubTTS(), 'demucs': StubDemucs()})
+    for name in models.status:
+        models.status[name] = 'ready'
+
+def stub_translation(processor, latency=0.0):
+    """Traducción sin red ni caché (con latencia opcional por petición)"""
+    processor.translator = TranslationService(OfflineBackend(latency))
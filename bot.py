@@ -1,9 +1,15 @@
+import asyncio
 import os
 import logging
-import asyncio
+import uuid
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
-from video_processor import VideoProcessor
+from job_queue import JobQueue
+from result_index import ResultIndex
+from admission import check_admission, format_seconds
+from ffmpeg_io import probe_media
+from workspace import cleanup_stale_workspaces
 from progress_animator import ProgressAnimator
 from config import TELEGRAM_TOKEN, SUPPORTED_LANGUAGES, MAX_VIDEO_SIZE_MB, TEMP_DIR, OUTPUT_DIR
 
@@ -13,16 +19,10 @@ logger = logging.getLogger(__name__)
 os.makedirs(TEMP_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-processor = None
 user_videos = {}
 animator = ProgressAnimator()
-
-def get_processor():
-    global processor
-    if processor is None:
-        logger.info("🚀 Inicializando modelos de IA...")
-        processor = VideoProcessor()
-    return processor
+job_queue = JobQueue()
+result_index = ResultIndex()
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
@@ -40,7 +40,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "📖 *Cómo usar el bot:*\n\n"
         "1. Envía un video (máx. 50MB)\n"
-        "2. Selecciona el idioma de destino\n"
+        "2. Selecciona uno o varios idiomas de destino\n"
         "3. Espera mientras proceso el video\n"
         "4. Recibe tu video doblado!\n\n"
         "*Características:*\n"
@@ -58,31 +58,176 @@ async def languages_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='Markdown'
     )
 
-async def handle_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    video = update.message.video
-    
-    if video.file_size > MAX_VIDEO_SIZE_MB * 1024 * 1024:
+LANGUAGE_PROMPT = "🌍 *Paso 1:* Selecciona uno o varios idiomas de destino y pulsa *Continuar*:"
+
+def language_keyboard(selected):
+    """Teclado de idiomas con los ya elegidos marcados"""
+    keyboard = []
+    for code, name in SUPPORTED_LANGUAGES.items():
+        mark = "✅ " if code in selected else ""
+        keyboard.append([InlineKeyboardButton(f"{mark}{name}", callback_data=f"lang_{code}")])
+    if selected:
+        keyboard.append([InlineKeyboardButton(f"➡️ Continuar ({len(selected)})", callback_data="langs_done")])
+    return InlineKeyboardMarkup(keyboard)
+
+async def receive_video(update: Update, context: ContextTypes.DEFAULT_TYPE, media):
+    """Recuerda el video del chat; se descarga sólo si hay que doblarlo"""
+    if media.file_size > MAX_VIDEO_SIZE_MB * 1024 * 1024:
         await update.message.reply_text(f"❌ El video es muy grande. Máximo: {MAX_VIDEO_SIZE_MB}MB")
         return
     
-    await update.message.reply_text("📥 Descargando video...")
+    user_videos[update.message.chat_id] = {
+        'file_id': media.file_id,
+        'file_unique_id': media.file_unique_id,
+        'path': None,
+    }
     
-    file = await context.bot.get_file(video.file_id)
-    video_path = os.path.join(TEMP_DIR, f"{update.message.chat_id}_{video.file_id}.mp4")
-    await file.download_to_drive(video_path)
+    context.user_data['target_langs'] = []
+    await update.message.reply_text(
+        LANGUAGE_PROMPT,
+        reply_markup=language_keyboard([]),
+        parse_mode='Markdown'
+    )
+
+async def download_video(context: ContextTypes.DEFAULT_TYPE, chat_id, source):
+    """Descarga el video del chat (una sola vez) y devuelve su ruta"""
+    if source['path'] is None or not os.path.exists(source['path']):
+        file = await context.bot.get_file(source['file_id'])
+        video_path = os.path.join(TEMP_DIR, f"{chat_id}_{source['file_id']}.mp4")
+        await file.download_to_drive(video_path)
+        source['path'] = video_path
+    return source['path']
+
+def dub_caption(target_lang, num_speakers, emotion, keep_background):
+    speakers_text = f"{num_speakers} hablante(s)"
+    bg_text = "🎵 Con audio de fondo" if keep_background else "🔇 Solo voces"
+    emotion_emoji = {'neutral': '😐', 'happy': '😄', 'sad': '😢', 'angry': '😡', 'excited': '🤩'}
+    emotion_text = f"{emotion_emoji.get(emotion, '🎭')} Emoción: {emotion.upper()}"
+    return (f"✨ *¡VIDEO DOBLADO EXITOSAMENTE!* ✨\n\n"
+            f"🌍 *Idioma:* {SUPPORTED_LANGUAGES[target_lang]}\n"
+            f"👥 *Hablantes:* {speakers_text}\n"
+            f"{emotion_text}\n"
+            f"{bg_text}\n\n"
+            f"🎤 Voz clonada con IA\n"
+            f"✅ Calidad profesional")
+
+async def send_cached_results(context: ContextTypes.DEFAULT_TYPE, chat_id, source, target_langs, keep_background):
+    """Reenvía por file_id los doblajes ya hechos; devuelve los idiomas enviados"""
+    sent = []
+    for target_lang in target_langs:
+        entry = result_index.get(source['file_unique_id'], target_lang, keep_background)
+        if entry is None:
+            continue
+        try:
+            await context.bot.send_video(
+                chat_id=chat_id,
+                video=entry['file_id'],
+                caption=dub_caption(target_lang, entry['num_speakers'], entry['emotion'], keep_background),
+                parse_mode='Markdown'
+            )
+        except TelegramError as e:
+            # El file_id ya no sirve: se vuelve a doblar
+            logger.warning(f"file_id en caché rechazado ({target_lang}): {e}")
+            result_index.remove(source['file_unique_id'], target_lang, keep_background)
+            continue
+        sent.append(target_lang)
+    return sent
+
+def forget_video(chat_id, source):
+    """Borra el video descargado de un trabajo; el chat lo olvida sólo si no envió otro después"""
+    if user_videos.get(chat_id) is source:
+        del user_videos[chat_id]
+    if source['path'] and os.path.exists(source['path']):
+        os.remove(source['path'])
+
+async def dub_video(query, context: ContextTypes.DEFAULT_TYPE, chat_id, source, target_langs, keep_background, job_id):
+    """Envía los doblajes ya hechos y dobla el resto de idiomas del video"""
+    # Idiomas ya doblados antes para este mismo archivo: respuesta inmediata
+    sent = await send_cached_results(context, chat_id, source, target_langs, keep_background)
+    target_langs = [target_lang for target_lang in target_langs if target_lang not in sent]
+    if not target_langs:
+        await query.edit_message_text("✅ ¡Proceso completado! (video(s) ya doblado(s) antes)")
+        forget_video(chat_id, source)
+        return
     
-    user_videos[update.message.chat_id] = video_path
+    await query.edit_message_text("📥 Descargando video...")
+    try:
+        video_path = await download_video(context, chat_id, source)
+        # Duración y audio reales: el tamaño del archivo no dice cuánto costará doblarlo
+        probe = await asyncio.to_thread(probe_media, video_path)
+    except Exception as e:
+        logger.error(f"Error downloading video: {e}")
+        await query.edit_message_text(f"❌ Error al descargar el video: {str(e)}")
+        return
     
-    keyboard = []
-    for code, name in SUPPORTED_LANGUAGES.items():
-        keyboard.append([InlineKeyboardButton(name, callback_data=f"lang_{code}")])
+    wait, cost = job_queue.estimate(chat_id, probe['duration'], len(target_langs))
+    # Otros trabajos del chat (sin contar éste), también los que aún se descargan
+    reason = check_admission(probe, job_queue.chat_pending(chat_id) - 1, wait)
+    if reason:
+        await query.edit_message_text(f"❌ {reason}")
+        forget_video(chat_id, source)
+        return
+    # Nombres únicos por trabajo: dos trabajos del mismo chat no comparten salida
+    token = uuid.uuid4().hex[:8]
+    output_paths = {
+        target_lang: os.path.join(OUTPUT_DIR, f"dubbed_{chat_id}_{token}_{target_lang}.mp4")
+        for target_lang in target_langs
+    }
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text(
-        "🌍 *Paso 1:* Selecciona el idioma de destino:",
-        reply_markup=reply_markup,
+    bg_text = "con audio de fondo" if keep_background else "solo voces"
+    status_text = 'Iniciando proceso' if job_queue.ready else 'Cargando modelos de IA'
+    if wait >= 1:
+        status_text = f"En cola: ~{format_seconds(wait)} de espera"
+    status_text += f" · ~{format_seconds(cost)} de proceso"
+    progress_message = await query.edit_message_text(
+        animator.format_progress_message('extracting', status_text, 0, bg_text),
         parse_mode='Markdown'
     )
+    
+    try:
+        # Progreso real de cada etapa, agrupado para no saturar a Telegram
+        tracker = animator.track(progress_message, chat_id, bg_text)
+        try:
+            results, num_speakers, emotion = await job_queue.submit(
+                video_path,
+                output_paths,
+                keep_background,
+                job_id=job_id,
+                progress_callback=tracker.update,
+                chat_id=chat_id,
+                duration=probe['duration']
+            )
+        finally:
+            await tracker.stop()
+        
+        await progress_message.edit_text("📤 Enviando video(s) doblado(s)...")
+        
+        for target_lang, result_path in results.items():
+            with open(result_path, 'rb') as video_file:
+                message = await context.bot.send_video(
+                    chat_id=chat_id,
+                    video=video_file,
+                    caption=dub_caption(target_lang, num_speakers, emotion, keep_background),
+                    parse_mode='Markdown'
+                )
+            os.remove(result_path)
+            # Guardar el file_id que asignó Telegram para reenviarlo sin volver a doblar
+            if message.video is not None:
+                result_index.put(
+                    source['file_unique_id'], target_lang, keep_background,
+                    message.video.file_id, num_speakers, emotion
+                )
+        
+        await progress_message.edit_text("✅ ¡Proceso completado!")
+        
+        forget_video(chat_id, source)
+        
+    except Exception as e:
+        logger.error(f"Error processing video: {e}")
+        await progress_message.edit_text(f"❌ Error al procesar el video: {str(e)}")
+
+async def handle_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await receive_video(update, context, update.message.video)
 
 async def handle_language_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -95,10 +240,25 @@ async def handle_language_selection(update: Update, context: ContextTypes.DEFAUL
         await query.edit_message_text("❌ Error: Video no encontrado. Envía un video nuevamente.")
         return
     
-    # Si es selección de idioma, preguntar por audio de fondo
+    # Selección de idiomas: cada pulsación marca o desmarca uno
     if data.startswith('lang_'):
         target_lang = data.split('_')[1]
-        context.user_data['target_lang'] = target_lang
+        selected = context.user_data.setdefault('target_langs', [])
+        if target_lang in selected:
+            selected.remove(target_lang)
+        else:
+            selected.append(target_lang)
+        
+        await query.edit_message_text(
+            LANGUAGE_PROMPT,
+            reply_markup=language_keyboard(selected),
+            parse_mode='Markdown'
+        )
+        return
+    
+    # Idiomas elegidos, preguntar por audio de fondo
+    if data == 'langs_done':
+        selected = context.user_data.get('target_langs') or ['es']
         
         keyboard = [
             [InlineKeyboardButton("🎵 Sí, mantener música/sonidos de fondo", callback_data="bg_yes")],
@@ -106,10 +266,11 @@ async def handle_language_selection(update: Update, context: ContextTypes.DEFAUL
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
+        langs_text = ", ".join(SUPPORTED_LANGUAGES[code] for code in selected)
         await query.edit_message_text(
             f"🎚️ *Paso 2:* ¿Mantener el audio de fondo?\n\n"
             f"(música, efectos de sonido, ambiente)\n\n"
-            f"Idioma seleccionado: {SUPPORTED_LANGUAGES[target_lang]}",
+            f"Idioma(s) seleccionado(s): {langs_text}",
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
@@ -118,126 +279,56 @@ async def handle_language_selection(update: Update, context: ContextTypes.DEFAUL
     # Si es selección de fondo, procesar video
     if data.startswith('bg_'):
         keep_background = (data == 'bg_yes')
-        target_lang = context.user_data.get('target_lang', 'es')
-        
-        video_path = user_videos[chat_id]
-        output_path = os.path.join(OUTPUT_DIR, f"dubbed_{chat_id}_{target_lang}.mp4")
-        
-        bg_text = "con audio de fondo" if keep_background else "solo voces"
-        progress_message = await query.edit_message_text(
-            animator.format_progress_message('extracting', 'Iniciando proceso', 0, bg_text),
-            parse_mode='Markdown'
-        )
-        
+        target_langs = list(context.user_data.get('target_langs') or ['es'])
+        source = user_videos[chat_id]
+        # Identificador estable (el mismo archivo reenviado da el mismo): si el trabajo
+        # falla puede reanudarse, y una doble pulsación no lo lanza dos veces
+        job_id = f"{chat_id}_{source['file_unique_id']}_{'-'.join(sorted(target_langs))}"
+        if not job_queue.reserve(job_id, chat_id):
+            await query.edit_message_text("⏳ Este video ya se está doblando a esos idiomas")
+            return
         try:
-            # Animación: Extrayendo audio
-            asyncio.create_task(
-                animator.animate_progress(progress_message, 'extracting', 'Extrayendo audio', 2)
-            )
-            await asyncio.sleep(2)
-            
-            # Animación: Separando audio
-            asyncio.create_task(
-                animator.animate_progress(progress_message, 'separating', 'Separando voces y fondo', 3)
-            )
-            await asyncio.sleep(3)
-            
-            # Animación: Detectando hablantes
-            asyncio.create_task(
-                animator.animate_progress(progress_message, 'detecting', 'Detectando hablantes', 2)
-            )
-            await asyncio.sleep(2)
-            
-            # Animación: Transcribiendo
-            asyncio.create_task(
-                animator.animate_progress(progress_message, 'transcribing', 'Transcribiendo con Whisper AI', 4)
-            )
-            await asyncio.sleep(4)
-            
-            # Animación: Traduciendo
-            asyncio.create_task(
-                animator.animate_progress(progress_message, 'translating', 'Traduciendo texto', 2)
-            )
-            await asyncio.sleep(2)
-            
-            # Animación: Clonando voz
-            asyncio.create_task(
-                animator.animate_progress(progress_message, 'cloning', 'Clonando voz con emociones', 5)
-            )
-            
-            proc = get_processor()
-            result_path, num_speakers, emotion = proc.process_video(
-                video_path,
-                target_lang,
-                output_path,
-                keep_background,
-                None
-            )
-            
-            # Animación: Finalizando
-            await animator.animate_progress(progress_message, 'finalizing', 'Finalizando video', 2)
-        
-            await progress_message.edit_text("📤 Enviando video doblado...")
-            
-            speakers_text = f"{num_speakers} hablante(s)"
-            bg_text = "🎵 Con audio de fondo" if keep_background else "🔇 Solo voces"
-            emotion_emoji = {'neutral': '😐', 'happy': '😄', 'sad': '😢', 'angry': '😡', 'excited': '🤩'}
-            emotion_text = f"{emotion_emoji.get(emotion, '🎭')} Emoción: {emotion.upper()}"
-            
-            with open(result_path, 'rb') as video_file:
-                await context.bot.send_video(
-                    chat_id=chat_id,
-                    video=video_file,
-                    caption=f"✨ *¡VIDEO DOBLADO EXITOSAMENTE!* ✨\n\n"
-                            f"🌍 *Idioma:* {SUPPORTED_LANGUAGES[target_lang]}\n"
-                            f"👥 *Hablantes:* {speakers_text}\n"
-                            f"{emotion_text}\n"
-                            f"{bg_text}\n\n"
-                            f"🎤 Voz clonada con IA\n"
-                            f"✅ Calidad profesional",
-                    parse_mode='Markdown'
-                )
-            
-            await progress_message.edit_text("✅ ¡Proceso completado!")
-            
-            os.remove(video_path)
-            os.remove(result_path)
-            del user_videos[chat_id]
-            
-        except Exception as e:
-            logger.error(f"Error processing video: {e}")
-            await progress_message.edit_text(f"❌ Error al procesar el video: {str(e)}")
+            await dub_video(query, context, chat_id, source, target_langs, keep_background, job_id)
+        finally:
+            job_queue.unreserve(job_id)
         return
 
 async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
     document = update.message.document
     
     if document.mime_type and document.mime_type.startswith('video/'):
-        if document.file_size > MAX_VIDEO_SIZE_MB * 1024 * 1024:
-            await update.message.reply_text(f"❌ El video es muy grande. Máximo: {MAX_VIDEO_SIZE_MB}MB")
-            return
-        
-        await update.message.reply_text("📥 Descargando video...")
-        
-        file = await context.bot.get_file(document.file_id)
-        video_path = os.path.join(TEMP_DIR, f"{update.message.chat_id}_{document.file_id}.mp4")
-        await file.download_to_drive(video_path)
-        
-        user_videos[update.message.chat_id] = video_path
-        
-        keyboard = []
-        for code, name in SUPPORTED_LANGUAGES.items():
-            keyboard.append([InlineKeyboardButton(name, callback_data=f"lang_{code}")])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
-            "🌍 *Paso 1:* Selecciona el idioma de destino:",
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        await receive_video(update, context, document)
+
+async def post_init(application: Application):
+    removed = cleanup_stale_workspaces()
+    if removed:
+        logger.info(f"🧹 Eliminados {removed} directorio(s) de trabajo huérfanos")
+    job_queue.start()
+    application.create_task(report_readiness())
+
+async def report_readiness():
+    """Registra cuándo quedan listos los modelos de cada worker"""
+    for index, report in enumerate(await job_queue.wait_ready(), 1):
+        if isinstance(report, Exception):
+            logger.error(f"❌ Worker {index}: precalentamiento fallido: {report}")
+        else:
+            details = ", ".join(f"{name}: {value}" + ("s" if isinstance(value, float) else "")
+                                for name, value in report.items())
+            logger.info(f"🔥 Worker {index} listo ({details})")
+    logger.info("✅ Modelos precalentados, listos para trabajos")
+
+async def post_shutdown(application: Application):
+    job_queue.shutdown()
 
 def main():
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(True)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
@@ -16,3 +16,106 @@ SUPPORTED_LANGUAGES = {
 MAX_VIDEO_SIZE_MB = 50
 TEMP_DIR = "./temp"
 OUTPUT_DIR = "./output"
+
+# Cola de trabajos: número de workers y modo ("process" o "thread")
+NUM_WORKERS = 2
+WORKER_MODE = "process"
+
+# Directorio de trabajo por job (vacío = /dev/shm si hay espacio, si no /tmp)
+WORKSPACE_ROOT = ""
+WORKSPACE_MIN_FREE_MB = 1024
+# Horas que se conservan los trabajos fallidos para poder reanudarlos
+RESUMABLE_WORKSPACE_TTL_HOURS = 24
+# Cada cuánto se buscan directorios caducados o huérfanos (al encolar trabajos)
+WORKSPACE_SWEEP_INTERVAL_SECONDS = 3600
+
+# Separación de voces con Demucs (segmentos solapados para acotar memoria)
+DEMUCS_MODEL = "htdemucs"
+SEPARATION_CHUNK_SECONDS = 30
+SEPARATION_OVERLAP_SECONDS = 2
+
+# Doblaje por segmentos
+OUTPUT_SAMPLE_RATE = 44100
+MAX_SEGMENT_SPEEDUP = 1.25
+TRANSLATION_WORKERS = 4
+
+# Síntesis XTTS: hilos por worker para condicionamiento y posproceso de los clips (la inferencia va de una en una) y latentes de hablante en caché
+TTS_WORKERS = 2
+TTS_LATENT_CACHE_SIZE = 8
+
+# Caché de artefactos por contenido (stems, transcripción, idioma y emoción)
+ARTIFACT_CACHE_DIR = "./cache/artifacts"
+ARTIFACT_CACHE_MAX_MB = 5000
+
+# Progreso: como mucho una edición de mensaje por chat cada N segundos (aunque tenga varios trabajos)
+PROGRESS_EDIT_INTERVAL = 3.0
+PROGRESS_POLL_SECONDS = 0.5
+
+# Detección de voz (VAD) sobre el stem de voces: sólo los tramos con voz van a Whisper y XTTS
+VAD_WINDOW_SECONDS = 0.1
+VAD_PAD_SECONDS = 0.25
+VAD_MIN_GAP_SECONDS = 1.0
+VAD_MIN_SPEECH_SECONDS = 0.3
+VAD_ENERGY_FLOOR = 0.005
+VAD_JOIN_GAP_SECONDS = 0.3
+
+# Mezcla por bloques con limitador (sin normalización global)
+MIX_BLOCK_SIZE = 65536
+MIX_HOP = 512
+MIX_CEILING = 0.95
+MIX_LOOKAHEAD_HOPS = 4
+
+# Transcripción: "faster-whisper" (CTranslate2, int8 en CPU) o "whisper" (PyTorch)
+ASR_BACKEND = "faster-whisper"
+ASR_MODEL_SIZE = "medium"
+ASR_COMPUTE_TYPE = "int8"
+
+# Modelos: se precargan en segundo plano al arrancar el bot, con una inferencia de prueba
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+WARMUP_ON_START = True
+WARMUP_MODELS = ("asr", "tts", "demucs")
+WARMUP_BARRIER_TIMEOUT = 120
+
+# Videos largos: separación, transcripción, traducción y síntesis por tramos solapados
+PIPELINE_MIN_SECONDS = 180
+PIPELINE_CHUNK_SECONDS = 60
+PIPELINE_SEARCH_SECONDS = 5
+PIPELINE_QUEUE_SIZE = 2
+
+# Diarización: distancia coseno máxima dentro de un hablante y referencias para XTTS
+DIARIZATION_THRESHOLD = 0.25
+DIARIZATION_MAX_SPEAKERS = 6
+DIARIZATION_MIN_SEGMENT_SECONDS = 1.0
+DIARIZATION_REFERENCE_SECONDS = 20
+
+# Métricas por trabajo: tiempos por etapa, bytes, factor de tiempo real, espera en cola y memoria
+METRICS_ENABLED = False
+METRICS_FILE = "./metrics/jobs.jsonl"  # una línea JSON por trabajo ("" para no escribir)
+METRICS_PORT = 0                       # p. ej. 9108: /metrics y /jobs en 127.0.0.1 (0 = sin servidor)
+METRICS_RECENT_JOBS = 50
+# cProfile de cada trabajo (sólo el hilo principal del trabajo), en PROFILE_DIR
+PROFILE_JOBS = False
+PROFILE_DIR = "./metrics/profiles"
+
+# Traducción: backend ("google" u "offline" para pruebas), frases por petición y caché persistente
+TRANSLATION_BACKEND = "google"
+TRANSLATION_BATCH_CHARS = 4500
+TRANSLATION_TIMEOUT = 15
+TRANSLATION_RETRIES = 3
+TRANSLATION_CACHE_PATH = "./cache/translations.sqlite3"
+TRANSLATION_CACHE_MAX_ENTRIES = 200000
+
+# Doblajes ya enviados: se reenvían por file_id de Telegram sin volver a procesar
+RESULT_INDEX_PATH = "./cache/results.sqlite3"
+RESULT_INDEX_MAX_ENTRIES = 100000
+
+# Admisión: límites por video y por chat, y cola justa entre chats por coste estimado
+ADMISSION_MAX_DURATION_SECONDS = 900
+ADMISSION_MAX_PENDING_PER_CHAT = 2
+ADMISSION_MAX_WAIT_SECONDS = 3600
+# Coste inicial (segundos de proceso por segundo de video) hasta medir trabajos reales
+COST_SHARED_RTF = 1.5
+COST_LANGUAGE_RTF = 1.0
+COST_FIXED_SECONDS = 10
+COST_SMOOTHING = 0.3
+COST_MODEL_PATH = "./cache/cost_model.json"
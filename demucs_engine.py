@@ -0,0 +1,82 @@
+import numpy as np
+import torch
+from demucs.apply import apply_model
+from demucs.pretrained import get_model
+from audio_buffer import AudioBuffer
+from config import DEMUCS_MODEL, SEPARATION_CHUNK_SECONDS, SEPARATION_OVERLAP_SECONDS
+
+class DemucsEngine:
+    """Modelo Demucs cargado una sola vez y aplicado por segmentos solapados"""
+
+    def __init__(self, model_name=DEMUCS_MODEL, device=None,
+                 chunk_seconds=SEPARATION_CHUNK_SECONDS, overlap_seconds=SEPARATION_OVERLAP_SECONDS):
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        print(f"🎵 Cargando Demucs ({model_name}) en {self.device}...")
+        self.model = get_model(model_name)
+        self.model.to(self.device)
+        self.model.eval()
+        self.rate = self.model.samplerate
+        self.channels = self.model.audio_channels
+        self.vocals_index = self.model.sources.index('vocals')
+        self.chunk = int(chunk_seconds * self.rate)
+        self.overlap = min(int(overlap_seconds * self.rate), self.chunk // 2)
+
+    def _prepare(self, audio):
+        """Audio a la frecuencia y canales del modelo, como (canales, frames)"""
+        data = audio.view(self.rate)
+        if data.shape[1] < self.channels:
+            data = np.repeat(data[:, :1], self.channels, axis=1)
+        elif data.shape[1] > self.channels:
+            data = data[:, :self.channels]
+        return np.ascontiguousarray(data.T)
+
+    def _fade_window(self, length, fade_in, fade_out):
+        window = np.ones(length, dtype=np.float32)
+        fade = min(self.overlap, length)
+        if fade_in and fade > 0:
+            window[:fade] = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+        if fade_out and fade > 0:
+            window[-fade:] *= np.linspace(1.0, 0.0, fade, dtype=np.float32)
+        return window
+
+    def separate(self, audio, progress_callback=None):
+        """Devuelve (voces, fondo) como arrays (canales, frames) a self.rate"""
+        mix = self._prepare(AudioBuffer.load(audio))
+        total = mix.shape[1]
+
+        # Misma normalización que usa el CLI de Demucs
+        ref = mix.mean(axis=0)
+        mean = float(ref.mean())
+        std = float(ref.std()) + 1e-8
+
+        vocals = np.zeros_like(mix)
+        background = np.zeros_like(mix)
+        weight = np.zeros(total, dtype=np.float32)
+
+        step = self.chunk - self.overlap
+        num_chunks = 1 + max(0, -(-(total - self.chunk) // step))
+
+        start = 0
+        for index in range(num_chunks):
+            end = min(start + self.chunk, total)
+            piece = torch.from_numpy((mix[:, start:end] - mean) / std)[None]
+
+            with torch.no_grad():
+                sources = apply_model(self.model, piece, device=self.device, split=True,
+                                      overlap=0.25, progress=False)[0]
+            sources = sources.cpu().numpy() * std + mean
+
+            piece_vocals = sources[self.vocals_index]
+            piece_background = sources.sum(axis=0) - piece_vocals
+
+            window = self._fade_window(end - start, start > 0, end < total)
+            vocals[:, start:end] += piece_vocals * window
+            background[:, start:end] += piece_background * window
+            weight[start:end] += window
+
+            if progress_callback:
+                progress_callback(index + 1, num_chunks)
+            start += step
+
+        weight = np.maximum(weight, 1e-8)
+        return vocals / weight, background / weight
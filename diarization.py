@@ -0,0 +1,206 @@
+import os
+import numpy as np
+from scipy import fft
+from scipy.cluster.hierarchy import linkage, fcluster
+from scipy.signal import get_window
+from audio_buffer import AudioBuffer
+from config import (DIARIZATION_THRESHOLD, DIARIZATION_MAX_SPEAKERS, DIARIZATION_MIN_SEGMENT_SECONDS,
+                    DIARIZATION_REFERENCE_SECONDS)
+
+def mel_filters(n_fft, rate, n_mels, fmin=60.0, fmax=None):
+    """Banco de filtros triangulares en escala mel, (n_mels, n_fft // 2 + 1)"""
+    fmax = fmax or rate / 2.0
+    mel = lambda hz: 2595.0 * np.log10(1.0 + hz / 700.0)
+    points = 700.0 * (10 ** (np.linspace(mel(fmin), mel(fmax), n_mels + 2) / 2595.0) - 1.0)
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / rate)
+    lower, center, upper = points[:-2, None], points[1:-1, None], points[2:, None]
+    rising = (freqs - lower) / (center - lower)
+    falling = (upper - freqs) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+
+class SpeakerClusters:
+    """Centroides de los hablantes encontrados; asigna embeddings de uno en uno
+
+    Sirve para el modo por tramos, donde los segmentos llegan poco a poco y no se
+    puede agrupar todo al final.
+    """
+
+    def __init__(self, threshold=DIARIZATION_THRESHOLD, max_speakers=DIARIZATION_MAX_SPEAKERS):
+        self.threshold = threshold
+        self.max_speakers = max_speakers
+        self.sums = []
+
+    def __len__(self):
+        return len(self.sums)
+
+    def nearest(self, embedding):
+        """(hablante, distancia coseno) del centroide más cercano"""
+        centroids = np.array(self.sums)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-10)
+        distances = 1.0 - centroids @ embedding
+        speaker = int(np.argmin(distances))
+        return speaker, float(distances[speaker])
+
+    def add(self, embedding, weight=1.0, create=True):
+        """Asigna el embedding a un hablante (nuevo si no se parece a ninguno)"""
+        if self.sums:
+            speaker, distance = self.nearest(embedding)
+            if distance <= self.threshold or not create or len(self.sums) >= self.max_speakers:
+                self.sums[speaker] = self.sums[speaker] + weight * embedding
+                return speaker
+        self.sums.append(weight * embedding)
+        return len(self.sums) - 1
+
+class SpeakerDiarizer:
+    """Quién habla en cada segmento, con embeddings de timbre y agrupamiento
+
+    El embedding de un segmento es la media y la desviación de sus MFCC (con
+    liftering) en las tramas con voz, normalizado; dos segmentos del mismo
+    hablante quedan a poca distancia coseno. Todo se calcula con una sola STFT
+    del audio de voces y sumas acumuladas, sin recorrer los segmentos trama a trama.
+    """
+
+    def __init__(self, threshold=DIARIZATION_THRESHOLD, max_speakers=DIARIZATION_MAX_SPEAKERS,
+                 min_segment_seconds=DIARIZATION_MIN_SEGMENT_SECONDS):
+        self.threshold = threshold
+        self.max_speakers = max_speakers
+        self.min_segment_seconds = min_segment_seconds
+        self.rate = 16000
+        self.n_fft = 512
+        self.hop = 160
+        self.n_mfcc = 20
+        self.filters = mel_filters(self.n_fft, self.rate, 40, fmax=7600.0)
+        # Liftering sinusoidal: equilibra el peso de los coeficientes altos y bajos
+        index = np.arange(1, self.n_mfcc)
+        self.lifter = (1.0 + 11.0 * np.sin(np.pi * index / 22.0)).astype(np.float32)
+
+    def frame_mfcc(self, samples, block_frames=4096):
+        """MFCC (sin c0) y energía log de cada trama de 10 ms"""
+        if len(samples) < self.n_fft:
+            samples = np.pad(samples, (0, self.n_fft - len(samples)))
+        frames = np.lib.stride_tricks.sliding_window_view(samples, self.n_fft)[::self.hop]
+        window = get_window('hann', self.n_fft).astype(np.float32)
+
+        mfcc, energy = [], []
+        for start in range(0, len(frames), block_frames):
+            power = np.abs(fft.rfft(frames[start:start + block_frames] * window, axis=1)) ** 2
+            log_mel = np.log(power @ self.filters.T + 1e-10)
+            cepstrum = fft.dct(log_mel, type=2, norm='ortho', axis=1)
+            mfcc.append(cepstrum[:, 1:self.n_mfcc] * self.lifter)
+            energy.append(cepstrum[:, 0])
+        return np.concatenate(mfcc).astype(np.float32), np.concatenate(energy).astype(np.float32)
+
+    def embed(self, vocals, segments):
+        """Embedding normalizado de cada segmento, (segmentos, 2 * coeficientes)
+
+        Un segmento sin tramas con voz (silencio, sólo música o fuera del audio)
+        queda con el embedding a cero.
+        """
+        mfcc, energy = self.frame_mfcc(AudioBuffer.load(vocals).mono(self.rate))
+        # Sólo tramas con voz: las pausas dentro de un segmento no dicen nada del hablante
+        voiced = (energy > np.percentile(energy, 30)).astype(np.float32)[:, None]
+
+        zero = np.zeros((1, mfcc.shape[1]), dtype=np.float64)
+        sums = np.concatenate([zero, np.cumsum(mfcc * voiced, axis=0, dtype=np.float64)])
+        squares = np.concatenate([zero, np.cumsum(mfcc ** 2 * voiced, axis=0, dtype=np.float64)])
+        counts = np.concatenate([[0.0], np.cumsum(voiced[:, 0], dtype=np.float64)])
+
+        frames_per_second = self.rate / float(self.hop)
+        first = np.array([int(segment['start'] * frames_per_second) for segment in segments], dtype=int)
+        last = np.array([int(np.ceil(segment['end'] * frames_per_second)) for segment in segments], dtype=int)
+        first = np.clip(first, 0, len(mfcc))
+        last = np.clip(np.maximum(last, first + 1), 0, len(mfcc))
+
+        count = np.maximum(counts[last] - counts[first], 1.0)[:, None]
+        mean = (sums[last] - sums[first]) / count
+        std = np.sqrt(np.maximum((squares[last] - squares[first]) / count - mean ** 2, 0.0))
+        embeddings = np.concatenate([mean, std], axis=1)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-10)
+        return embeddings.astype(np.float32)
+
+    def diarize(self, vocals, segments):
+        """Añade 'speaker' a cada segmento agrupando todos a la vez; devuelve el número de hablantes"""
+        if not segments:
+            return 0
+        embeddings = self.embed(vocals, segments)
+        durations = np.array([segment['end'] - segment['start'] for segment in segments])
+        # Sin voz el embedding es cero y la distancia coseno no está definida
+        voiced = np.linalg.norm(embeddings, axis=1) > 0
+        long_enough = np.flatnonzero((durations >= self.min_segment_seconds) & voiced)
+
+        labels = np.zeros(len(segments), dtype=int)
+        if len(long_enough) >= 2:
+            tree = linkage(embeddings[long_enough], method='average', metric='cosine')
+            found = fcluster(tree, t=self.threshold, criterion='distance')
+            if found.max() > self.max_speakers:
+                found = fcluster(tree, t=self.max_speakers, criterion='maxclust')
+            labels[long_enough] = found - 1
+
+        # Los segmentos cortos o sin voz (embedding poco fiable) van al hablante más
+        # parecido; si no hay ningún hablante, se quedan en el 0
+        short = np.setdiff1d(np.arange(len(segments)), long_enough)
+        if len(long_enough) and len(short):
+            clusters = SpeakerClusters(self.threshold, self.max_speakers)
+            clusters.sums = [
+                (durations[long_enough][labels[long_enough] == label, None] *
+                 embeddings[long_enough][labels[long_enough] == label]).sum(axis=0)
+                for label in range(labels.max() + 1)
+            ]
+            for index in short:
+                labels[index] = clusters.nearest(embeddings[index])[0]
+
+        self._label(segments, labels)
+        return len(set(labels.tolist()))
+
+    def diarize_online(self, vocals, segments, clusters):
+        """Como diarize, pero contra los hablantes ya vistos en tramos anteriores"""
+        if not segments:
+            return len(clusters)
+        embeddings = self.embed(vocals, segments)
+        for segment, embedding in zip(segments, embeddings):
+            duration = segment['end'] - segment['start']
+            if not np.any(embedding):
+                # Sin voz: no dice nada del hablante ni debe mover los centroides
+                segment['speaker'] = clusters.nearest(embedding)[0] if len(clusters) else 0
+                continue
+            segment['speaker'] = clusters.add(
+                embedding, duration, create=duration >= self.min_segment_seconds or not len(clusters)
+            )
+        return len(clusters)
+
+    def _label(self, segments, labels):
+        # Numerar los hablantes por orden de aparición
+        order = {}
+        for segment, label in zip(segments, labels.tolist()):
+            segment['speaker'] = order.setdefault(label, len(order))
+
+    def reference_clips(self, vocals, segments, output_dir, skip=(), seconds=DIARIZATION_REFERENCE_SECONDS):
+        """Escribe la referencia de voz de cada hablante para XTTS; devuelve {hablante: ruta}
+
+        Usa los segmentos más largos de cada hablante hasta sumar `seconds`,
+        en orden de aparición. Los hablantes de `skip` ya tienen referencia.
+        """
+        vocals = AudioBuffer.load(vocals)
+        samples, rate = vocals.mono(), vocals.rate
+        gap = np.zeros(int(0.2 * rate), dtype=np.float32)
+
+        by_speaker = {}
+        for segment in segments:
+            by_speaker.setdefault(segment.get('speaker', 0), []).append(segment)
+
+        references = {}
+        for speaker, own in by_speaker.items():
+            if speaker in skip:
+                continue
+            chosen, total = [], 0.0
+            for segment in sorted(own, key=lambda segment: segment['start'] - segment['end']):
+                if total >= seconds:
+                    break
+                chosen.append(segment)
+                total += segment['end'] - segment['start']
+            pieces = []
+            for segment in sorted(chosen, key=lambda segment: segment['start']):
+                pieces.extend([samples[int(segment['start'] * rate):int(segment['end'] * rate)], gap])
+            path = os.path.join(output_dir, f"speaker_{speaker}.wav")
+            references[speaker] = AudioBuffer(np.concatenate(pieces), rate).write(path)
+        return references
@@ -1,22 +1,24 @@
 #!/usr/bin/env python3
-import whisper
-from TTS.api import TTS
-import torch
+from model_registry import models
+from config import ASR_BACKEND, ASR_MODEL_SIZE
 
 print("=" * 50)
 print("Descargando modelos de IA...")
 print("=" * 50)
 
-print("\n1. Whisper (transcripción)...")
-whisper.load_model("base")
-print("✓ Whisper listo")
+print(f"\n1. {ASR_BACKEND} {ASR_MODEL_SIZE} (transcripción)...")
+models.get('asr')
+print("✓ Transcripción lista")
 
 print("\n2. XTTS v2 (clonación de voz)...")
 print("   Esto puede tomar 5-10 minutos...")
-device = "cuda" if torch.cuda.is_available() else "cpu"
-tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2").to(device)
+models.get('tts')
 print("✓ XTTS v2 listo")
 
+print("\n3. Demucs (separación de voces)...")
+models.get('demucs')
+print("✓ Demucs listo")
+
 print("\n" + "=" * 50)
 print("¡Todos los modelos descargados!")
 print("=" * 50)
@@ -1,6 +1,9 @@
-import librosa
 import numpy as np
 import soundfile as sf
+from scipy import fft
+from scipy.signal import get_window
+from audio_buffer import AudioBuffer
+from voice_transform import transform_voice
 
 class EmotionDetector:
     def __init__(self):
@@ -12,57 +15,134 @@ class EmotionDetector:
             'excited': {'speed': 1.2, 'pitch': 3, 'energy': 1.4}
         }
     
-    def analyze_emotion(self, audio_path):
-        """Analiza la emoción del audio"""
-        y, sr = librosa.load(audio_path, sr=22050)
+    def extract_features(self, audio, sr=22050, n_fft=2048, hop_length=512, block_frames=1024):
+        """RMS, ZCR, centroide y flujo espectral por trama, todo de una sola STFT
+        
+        Se calcula una vez por trabajo y luego se reutiliza para el video entero y
+        para cada segmento. Las tramas se procesan por bloques para acotar memoria.
+        """
+        y = AudioBuffer.load(audio).mono(sr)
+        if len(y) < n_fft:
+            y = np.pad(y, (0, n_fft - len(y)))
+        
+        frames = np.lib.stride_tricks.sliding_window_view(y, n_fft)[::hop_length]
+        window = get_window('hann', n_fft).astype(np.float32)
+        freqs = np.fft.rfftfreq(n_fft, 1.0 / sr).astype(np.float32)
+        # Compensa la atenuación de la ventana para que el RMS sea comparable al de la señal
+        power_norm = n_fft * np.sum(window ** 2)
+        
+        rms, zcr, centroid, flux = [], [], [], []
+        previous = None
+        for start in range(0, len(frames), block_frames):
+            block = frames[start:start + block_frames]
+            magnitude = np.abs(fft.rfft(block * window, axis=1))
+            power = magnitude ** 2
+            
+            rms.append(np.sqrt((2 * power.sum(axis=1) - power[:, 0] - power[:, -1]) / power_norm))
+            centroid.append(magnitude @ freqs / np.maximum(magnitude.sum(axis=1), 1e-10))
+            signs = np.signbit(block)
+            zcr.append(np.mean(signs[:, 1:] != signs[:, :-1], axis=1))
+            
+            # Flujo espectral (log) para estimar el ritmo del habla
+            log_magnitude = np.log1p(magnitude)
+            if previous is None:
+                previous = log_magnitude[:1]
+            stacked = np.concatenate([previous, log_magnitude])
+            flux.append(np.maximum(0, np.diff(stacked, axis=0)).sum(axis=1))
+            previous = log_magnitude[-1:]
+        
+        flux = np.concatenate(flux).astype(np.float32)
+        
+        # Picos del flujo = ataques (sílabas, golpes de voz)
+        threshold = flux.mean() + 0.5 * flux.std()
+        onsets = np.zeros(len(flux), dtype=bool)
+        if len(flux) > 2:
+            middle = flux[1:-1]
+            onsets[1:-1] = (middle > flux[:-2]) & (middle >= flux[2:]) & (middle > threshold)
+            # Ignorar picos pegados a otro (< ~70 ms), que son del mismo ataque
+            peaks = np.flatnonzero(onsets)
+            onsets[peaks[1:][np.diff(peaks) < 3]] = False
+        
+        return {
+            'hop_seconds': hop_length / float(sr),
+            'rms': np.concatenate(rms).astype(np.float32),
+            'zcr': np.concatenate(zcr).astype(np.float32),
+            'centroid': np.concatenate(centroid).astype(np.float32),
+            'onsets': onsets,
+        }
+    
+    def merge_features(self, parts):
+        """Une las características de tramos consecutivos en las del audio completo"""
+        merged = {'hop_seconds': parts[0]['hop_seconds']}
+        for key in ('rms', 'zcr', 'centroid', 'onsets'):
+            merged[key] = np.concatenate([part[key] for part in parts])
+        return merged
+    
+    def classify(self, features, start=None, end=None):
+        """Clasifica la emoción de un tramo (en segundos) a partir de las características"""
+        hop = features['hop_seconds']
+        first = 0 if start is None else int(start / hop)
+        last = len(features['rms']) if end is None else max(first + 1, int(np.ceil(end / hop)))
         
-        # Extraer características
-        tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-        spectral_centroid = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
-        rms = np.mean(librosa.feature.rms(y=y))
-        zcr = np.mean(librosa.feature.zero_crossing_rate(y))
+        rms = float(np.mean(features['rms'][first:last])) if last > first else 0.0
+        zcr = float(np.mean(features['zcr'][first:last])) if last > first else 0.0
+        spectral_centroid = float(np.mean(features['centroid'][first:last])) if last > first else 0.0
+        # Ataques por segundo: sustituye al tempo del beat tracker, que no tiene sentido en voz
+        seconds = max((last - first) * hop, 1e-6)
+        speech_rate = float(np.count_nonzero(features['onsets'][first:last])) / seconds
         
         # Clasificar emoción basada en características
         emotion = 'neutral'
         
-        if tempo > 140 and rms > 0.05:
+        if speech_rate > 5.0 and rms > 0.05:
             emotion = 'excited'
-        elif tempo > 120 and spectral_centroid > 2000:
+        elif speech_rate > 4.0 and spectral_centroid > 2000:
             emotion = 'happy'
-        elif tempo < 80 and rms < 0.03:
+        elif speech_rate < 2.0 and rms < 0.03:
             emotion = 'sad'
         elif rms > 0.06 and zcr > 0.1:
             emotion = 'angry'
         
+        return emotion, {'speech_rate': speech_rate, 'rms': rms, 'zcr': zcr, 'centroid': spectral_centroid}
+    
+    def analyze_emotion(self, audio, features=None):
+        """Analiza la emoción del audio"""
+        if features is None:
+            features = self.extract_features(audio)
+        
+        emotion, stats = self.classify(features)
         params = self.emotions[emotion]
         
         print(f"🎭 Emoción detectada: {emotion.upper()}")
-        print(f"   Tempo: {float(tempo):.1f} BPM")
-        print(f"   Energía: {float(rms):.3f}")
-        print(f"   Tono promedio: {float(spectral_centroid):.1f} Hz")
+        print(f"   Ritmo: {stats['speech_rate']:.1f} ataques/s")
+        print(f"   Energía: {stats['rms']:.3f}")
+        print(f"   Tono promedio: {stats['centroid']:.1f} Hz")
         
         return emotion, params
     
-    def apply_emotion_to_audio(self, audio_path, output_path, emotion_params):
-        """Aplica parámetros emocionales al audio"""
-        y, sr = librosa.load(audio_path, sr=44100)  # Mayor calidad
-        
-        # Ajustar velocidad suavemente
-        if emotion_params['speed'] != 1.0:
-            speed_factor = 1.0 + (emotion_params['speed'] - 1.0) * 0.5  # Suavizar
-            y = librosa.effects.time_stretch(y, rate=speed_factor)
-        
-        # Ajustar tono suavemente
-        if emotion_params['pitch'] != 0:
-            pitch_steps = emotion_params['pitch'] * 0.5  # Suavizar
-            y = librosa.effects.pitch_shift(y, sr=sr, n_steps=pitch_steps)
-        
-        # Ajustar energía suavemente
-        energy_factor = 1.0 + (emotion_params['energy'] - 1.0) * 0.3  # Suavizar
-        y = y * energy_factor
+    def label_segments(self, features, segments):
+        """Añade a cada segmento su propia emoción ('emotion')"""
+        for segment in segments:
+            segment['emotion'], _ = self.classify(features, segment['start'], segment['end'])
+        return segments
+    
+    def transform_settings(self, emotion_params):
+        """Velocidad, semitonos y ganancia suavizados a partir de los parámetros emocionales"""
+        speed = 1.0 + (emotion_params['speed'] - 1.0) * 0.5  # Suavizar
+        pitch_steps = emotion_params['pitch'] * 0.5  # Suavizar
+        gain = 1.0 + (emotion_params['energy'] - 1.0) * 0.3  # Suavizar
+        return speed, pitch_steps, gain
+    
+    def apply_emotion_to_audio(self, audio, output_path, emotion_params):
+        """Aplica parámetros emocionales al audio (velocidad, tono y energía en una pasada)"""
+        # Se trabaja a la frecuencia original; la línea de tiempo remuestrea después
+        audio = AudioBuffer.load(audio)
+        sr = audio.rate
+        speed, pitch_steps, gain = self.transform_settings(emotion_params)
+        y = transform_voice(audio.mono(), sr, speed, pitch_steps, gain)
         
         # Normalizar con compresión dinámica
-        max_val = np.max(np.abs(y))
+        max_val = np.max(np.abs(y)) if len(y) else 0
         if max_val > 0:
             y = y / max_val * 0.98
         
@@ -0,0 +1,176 @@
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import numpy as np
+from audio_buffer import AudioBuffer
+
+def _check(returncode, stderr, action):
+    """Lanza un error con el final del log de ffmpeg si terminó mal"""
+    if returncode != 0:
+        if isinstance(stderr, bytes):
+            stderr = stderr.decode('utf-8', errors='replace')
+        detail = (stderr or '').strip().splitlines()[-3:]
+        raise Exception(f"ffmpeg falló al {action} (código {returncode}): {' | '.join(detail)}")
+
+def probe_media(path):
+    """Duración y propiedades del audio con ffprobe, sin decodificar nada
+
+    Devuelve {'duration', 'has_video', 'has_audio', 'audio_rate', 'audio_channels'}.
+    """
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path],
+        stdin=subprocess.DEVNULL, capture_output=True
+    )
+    if result.returncode != 0:
+        detail = result.stderr.decode('utf-8', errors='replace').strip().splitlines()[-3:]
+        raise Exception(f"ffprobe no pudo leer el video: {' | '.join(detail)}")
+    info = json.loads(result.stdout)
+    streams = info.get('streams', [])
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+    # La duración del contenedor; si falta, la del stream más largo
+    duration = float(info.get('format', {}).get('duration') or 0.0)
+    if not duration:
+        duration = max([float(stream.get('duration') or 0.0) for stream in streams] or [0.0])
+    return {
+        'duration': duration,
+        'has_video': any(stream.get('codec_type') == 'video' for stream in streams),
+        'has_audio': audio is not None,
+        'audio_rate': int(audio.get('sample_rate') or 0) if audio else 0,
+        'audio_channels': int(audio.get('channels') or 0) if audio else 0,
+    }
+
+def _read_all(stream, chunks):
+    for block in iter(lambda: stream.read(1024 * 1024), b''):
+        chunks.append(block)
+    stream.close()
+
+def decode_streams(path, formats):
+    """Un solo demux y decodificado con varias salidas [(frecuencia, canales), ...]
+
+    ffmpeg divide el audio con asplit y escribe cada versión en su propia
+    tubería (la primera por stdout y el resto por descriptores extra), que se
+    leen en paralelo para que ninguna se llene y bloquee a las demás.
+    """
+    branches = ''.join(f"[a{index}]" for index in range(len(formats)))
+    graph = [f"[0:a:0]asplit={len(formats)}{branches}"]
+    for index, (rate, channels) in enumerate(formats):
+        layout = 'mono' if channels == 1 else 'stereo'
+        graph.append(f"[a{index}]aresample={rate},aformat=sample_fmts=flt:channel_layouts={layout}[o{index}]")
+
+    pipes = [os.pipe() for _ in formats[1:]]
+    command = ['ffmpeg', '-nostdin', '-v', 'error', '-i', path, '-filter_complex', ';'.join(graph)]
+    targets = ['pipe:1'] + [f"pipe:{write_fd}" for _, write_fd in pipes]
+    for index, target in enumerate(targets):
+        command += ['-map', f"[o{index}]", '-f', 'f32le', target]
+
+    with tempfile.TemporaryFile() as log:
+        try:
+            process = subprocess.Popen(
+                command, stdout=subprocess.PIPE, stderr=log,
+                pass_fds=[write_fd for _, write_fd in pipes]
+            )
+        finally:
+            # El proceso padre sólo lee: cerrar los extremos de escritura
+            for _, write_fd in pipes:
+                os.close(write_fd)
+
+        streams = [process.stdout] + [os.fdopen(read_fd, 'rb') for read_fd, _ in pipes]
+        chunks = [[] for _ in streams]
+        readers = [threading.Thread(target=_read_all, args=(stream, out), daemon=True)
+                   for stream, out in zip(streams, chunks)]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        returncode = process.wait()
+        log.seek(0)
+        _check(returncode, log.read(), "extraer el audio")
+
+    buffers = []
+    for (rate, channels), out in zip(formats, chunks):
+        samples = np.frombuffer(b''.join(out), dtype=np.float32).reshape(-1, channels)
+        buffers.append(AudioBuffer(samples, rate))
+    return buffers
+
+class MuxWriter:
+    """Codifica el audio que se le escribe directamente en el video final
+
+    ffmpeg copia el video original y recibe el audio como PCM float32 por su
+    entrada estándar. Se usa como gestor de contexto: al salir se cierra la
+    entrada y se comprueba el código de salida.
+
+    ffmpeg escribe en un nombre temporal junto a la salida, que sólo pasa a
+    output_path si termina bien; si falla, el archivo a medias se borra.
+    """
+
+    def __init__(self, video_path, output_path, rate, channels):
+        self.rate = rate
+        self.channels = channels
+        self.output_path = output_path
+        # Misma extensión: ffmpeg elige el formato por ella
+        base, extension = os.path.splitext(output_path)
+        self._partial = f"{base}.partial{extension}"
+        self._finished = False
+        # stderr a un archivo para que ffmpeg nunca se bloquee escribiendo el log
+        self._log = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            ['ffmpeg', '-v', 'error', '-y', '-i', video_path,
+             '-f', 'f32le', '-ar', str(rate), '-ac', str(channels), '-i', 'pipe:0',
+             '-map', '0:v:0', '-map', '1:a:0', '-c:v', 'copy', '-shortest', self._partial],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._log
+        )
+
+    def write(self, block):
+        """Envía un bloque (frames, canales) o mono a ffmpeg"""
+        if self._finished:
+            return
+        block = np.ascontiguousarray(block, dtype=np.float32)
+        try:
+            self._process.stdin.write(block.tobytes())
+        except BrokenPipeError:
+            # Con -shortest ffmpeg termina cuando acaba el video y deja de leer:
+            # el audio que sobra se descarta. Si terminó con error, close() lo informa.
+            if self._process.wait() != 0:
+                self.close()
+            self._finished = True
+
+    def close(self):
+        if self._log.closed:
+            return
+        if self._process.stdin and not self._process.stdin.closed:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = self._process.wait()
+        self._log.seek(0)
+        stderr = self._log.read()
+        self._log.close()
+        if returncode != 0:
+            self._discard()
+        _check(returncode, stderr, "generar el video final")
+        os.replace(self._partial, self.output_path)
+
+    def _discard(self):
+        if os.path.exists(self._partial):
+            os.remove(self._partial)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Error al mezclar: no dejar un ffmpeg colgado ni un video a medias
+            self._process.kill()
+            self._process.wait()
+            self._log.close()
+            self._discard()
+        return False
+
+def mux_writer(video_path, output_path):
+    """Fábrica para mix_audio: abre el MuxWriter cuando se conocen frecuencia y canales"""
+    return lambda rate, channels: MuxWriter(video_path, output_path, rate, channels)
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from metrics import NULL_METRICS, JobMetrics, MetricsStore, MetricsServer, export_report, profile_job
+from admission import CostModel, FairScheduler
+from workspace import cleanup_stale_workspaces
+from config import NUM_WORKERS, WORKER_MODE, PROGRESS_POLL_SECONDS, WARMUP_ON_START, WARMUP_BARRIER_TIMEOUT
+from config import WORKSPACE_SWEEP_INTERVAL_SECONDS
+from config import METRICS_ENABLED, METRICS_PORT, PROFILE_JOBS
+
+logger = logging.getLogger(__name__)
+
+# Cada worker (hilo o proceso) guarda aquí su propio VideoProcessor
+_worker_state = threading.local()
+# En modo hilo cada worker necesita su propio registro: XTTS y Whisper no son seguros entre hilos
+_private_models = False
+
+def get_worker_processor():
+    """Devuelve el VideoProcessor del worker actual, cargándolo la primera vez"""
+    processor = getattr(_worker_state, 'processor', None)
+    if processor is None:
+        from video_processor import VideoProcessor
+        from model_registry import ModelRegistry, models
+        processor = VideoProcessor(ModelRegistry() if _private_models else models)
+        _worker_state.processor = processor
+    return processor
+
+def _warm_up_worker(barrier=None):
+    """Carga y prueba los modelos en el worker actual; devuelve {modelo: segundos o error}"""
+    if barrier is not None:
+        # Esperar a que cada worker tenga su tarea, así ninguno hace dos precalentamientos
+        try:
+            barrier.wait(WARMUP_BARRIER_TIMEOUT)
+        except threading.BrokenBarrierError:
+            pass
+    return get_worker_processor().models.warm_up()
+
+def _models_loaded(status):
+    return {name for name, state in status.items() if state in ('loaded', 'ready')}
+
+def _run_job(job, updates=None, submitted=None):
+    """Punto de entrada de un trabajo dentro del worker
+
+    Devuelve (resultado, informe de métricas o None, muestra de coste o None).
+    La muestra son los segundos de proceso medidos en el worker, sin la espera
+    en cola; no hay muestra si el trabajo cargó modelos o salió de la caché,
+    porque no reflejan lo que cuesta un trabajo normal.
+    """
+    progress_callback = None
+    if updates is not None:
+        def progress_callback(stage, fraction):
+            updates.put((stage, fraction))
+    
+    metrics = NULL_METRICS
+    if METRICS_ENABLED:
+        metrics = JobMetrics(job['job_id'], time.time() - submitted if submitted else 0.0)
+    profile_name = job['job_id'] or f"job_{os.getpid()}_{int(time.time())}"
+    processor = get_worker_processor()
+    loaded = _models_loaded(processor.models.status)
+    started = time.perf_counter()
+    try:
+        with profile_job(profile_name, PROFILE_JOBS):
+            result = processor.process_video_multi(
+                progress_callback=progress_callback, metrics=metrics, **job
+            )
+    except Exception as e:
+        if metrics.enabled:
+            # El informe viaja con la excepción, también entre procesos
+            e.metrics_report = metrics.report(e)
+            export_report(e.metrics_report)
+        raise
+    
+    seconds = time.perf_counter() - started
+    
+    report = None
+    if metrics.enabled:
+        report = metrics.report()
+        export_report(report)
+    cold = _models_loaded(processor.models.status) - loaded
+    sample = None if cold or processor.cache_hit else seconds
+    return result, report, sample
+
+class JobQueue:
+    def __init__(self, num_workers=NUM_WORKERS, mode=WORKER_MODE):
+        if mode not in ('process', 'thread'):
+            raise ValueError(f"Modo de worker desconocido: {mode}")
+        self.num_workers = max(1, int(num_workers))
+        self.mode = mode
+        self.executor = None
+        self.manager = None
+        self.pending = 0
+        self.warmups = []
+        self.ready = False
+        self.metrics = MetricsStore()
+        self.metrics_server = None
+        # Los trabajos esperan aquí su turno; el executor sólo recibe los que ya pueden correr
+        self.scheduler = FairScheduler(self.num_workers)
+        self.cost_model = CostModel()
+        # job_id -> chat de los trabajos en curso, desde antes de descargar el video hasta
+        # enviar el resultado: un mismo job_id comparte directorio de trabajo y no puede ir
+        # dos veces, y la admisión cuenta aquí los trabajos de cada chat
+        self.active_jobs = {}
+        self.last_sweep = time.monotonic()
+
+    def start(self):
+        """Arranca el pool de workers"""
+        global _private_models
+        if self.executor is not None:
+            return
+        if self.mode == 'process':
+            # spawn evita heredar el estado de torch/CUDA del proceso del bot
+            context = multiprocessing.get_context('spawn')
+            self.executor = ProcessPoolExecutor(max_workers=self.num_workers, mp_context=context)
+            # Las colas de progreso deben poder cruzar entre procesos
+            self.manager = context.Manager()
+        else:
+            _private_models = True
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.num_workers,
+                thread_name_prefix='dub-worker'
+            )
+        logger.info(f"⚙️ Cola de trabajos iniciada: {self.num_workers} worker(s) en modo {self.mode}")
+        if METRICS_ENABLED and METRICS_PORT:
+            self.metrics_server = MetricsServer(self.metrics, METRICS_PORT)
+            logger.info(f"📈 Métricas en {self.metrics_server.start()}")
+        if WARMUP_ON_START:
+            self.warm_up()
+        else:
+            self.ready = True
+    
+    def warm_up(self):
+        """Precalienta los modelos en segundo plano, una tarea por worker"""
+        # Cada worker tiene sus modelos: una tarea por worker, retenidas en la barrera
+        # para que ninguno haga dos precalentamientos
+        barrier = self.manager.Barrier(self.num_workers) if self.mode == 'process' else threading.Barrier(self.num_workers)
+        self.warmups = [self.executor.submit(_warm_up_worker, barrier) for _ in range(self.num_workers)]
+    
+    async def wait_ready(self):
+        """Espera a que terminen los precalentamientos y devuelve sus informes"""
+        reports = await asyncio.gather(
+            *(asyncio.wrap_future(future) for future in self.warmups),
+            return_exceptions=True
+        )
+        self.ready = True
+        return reports
+
+    def shutdown(self, wait=True):
+        """Detiene el pool de workers"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=True)
+            self.executor = None
+        if self.manager is not None:
+            self.manager.shutdown()
+            self.manager = None
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+
+    async def _relay_progress(self, updates, progress_callback):
+        """Lleva al bucle de eventos el progreso que publican los workers"""
+        while True:
+            try:
+                stage, fraction = updates.get_nowait()
+            except queue.Empty:
+                await asyncio.sleep(PROGRESS_POLL_SECONDS)
+                continue
+            progress_callback(stage, fraction)
+
+    def reserve(self, job_id, chat_id):
+        """Marca job_id como en curso para el chat; False si ya lo estaba (p. ej. un botón pulsado dos veces)
+
+        Se llama antes del primer await del bot, así la plaza del chat queda
+        ocupada aunque otros videos del mismo chat se estén descargando a la vez.
+        """
+        if job_id in self.active_jobs:
+            return False
+        self.active_jobs[job_id] = chat_id
+        return True
+
+    def unreserve(self, job_id):
+        self.active_jobs.pop(job_id, None)
+
+    def chat_pending(self, chat_id):
+        """Trabajos reservados del chat: descargando, en cola o en marcha"""
+        return sum(1 for owner in self.active_jobs.values() if owner == chat_id)
+
+    async def sweep_workspaces(self):
+        """Borra directorios de trabajo caducados o huérfanos, como mucho una vez por intervalo
+
+        Los fallidos se conservan para reanudarlos; sin esto se acumularían en
+        /dev/shm mientras el bot siga en marcha.
+        """
+        if time.monotonic() - self.last_sweep < WORKSPACE_SWEEP_INTERVAL_SECONDS:
+            return 0
+        self.last_sweep = time.monotonic()
+        removed = await asyncio.to_thread(cleanup_stale_workspaces, None, set(self.active_jobs))
+        if removed:
+            logger.info(f"🧹 Eliminados {removed} directorio(s) de trabajo caducados")
+        return removed
+
+    def estimate(self, chat_id, duration, languages):
+        """(segundos de espera, segundos de proceso) estimados para un trabajo nuevo del chat"""
+        cost = self.cost_model.estimate(duration, languages)
+        return self.scheduler.estimate_wait(chat_id, cost), cost
+    
+    async def submit(self, video_path, output_paths, keep_background=True, job_id=None, progress_callback=None,
+                     chat_id=None, duration=None):
+        """Encola un trabajo de doblaje ({idioma: salida}) y espera su resultado sin bloquear el bot
+        
+        Los trabajos arrancan por turnos justos entre chats según su coste
+        estimado a partir de la duración del video.
+        """
+        self.start()
+        await self.sweep_workspaces()
+        submitted = time.time()
+        ticket = await self.scheduler.acquire(chat_id, self.cost_model.estimate(duration, len(output_paths)))
+        try:
+            return await self._run(video_path, output_paths, keep_background, job_id, progress_callback, duration, submitted)
+        finally:
+            self.scheduler.release(ticket)
+    
+    async def _run(self, video_path, output_paths, keep_background, job_id, progress_callback, duration, submitted):
+        job = {
+            'video_path': video_path,
+            'output_paths': output_paths,
+            'keep_background': keep_background,
+            'job_id': job_id,
+        }
+        loop = asyncio.get_running_loop()
+
+        updates = None
+        relay = None
+        if progress_callback is not None:
+            updates = self.manager.Queue() if self.manager is not None else queue.Queue()
+            relay = asyncio.create_task(self._relay_progress(updates, progress_callback))
+
+        self.pending += 1
+        try:
+            result, report, sample = await loop.run_in_executor(self.executor, _run_job, job, updates, submitted)
+        except Exception as e:
+            report = getattr(e, 'metrics_report', None)
+            if report is not None:
+                self.metrics.record(report)
+            raise
+        else:
+            if report is not None:
+                self.metrics.record(report)
+            if sample is not None:
+                self.cost_model.observe(duration, len(output_paths), sample, report)
+            return result
+        finally:
+            self.pending -= 1
+            if relay is not None:
+                relay.cancel()
@@ -0,0 +1,262 @@
+import contextlib
+import cProfile
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_FILE, METRICS_RECENT_JOBS, PROFILE_DIR
+
+def peak_rss_bytes():
+    """Pico de memoria residente del proceso (desde el último reinicio si se pudo)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def reset_peak_rss():
+    """Reinicia el pico de memoria (Linux); en otros sistemas el pico es acumulado"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+class NullMetrics:
+    """Métricas desactivadas: span y add no hacen nada"""
+
+    enabled = False
+
+    def span(self, name, audio_seconds=None, **fields):
+        return contextlib.nullcontext({})
+
+    def add(self, name, value):
+        pass
+
+NULL_METRICS = NullMetrics()
+
+class JobMetrics:
+    """Tramos (spans) y contadores de un trabajo de doblaje
+
+    Cada span guarda tiempo de pared, CPU del proceso y, si se indica cuánto
+    audio trató, el factor de tiempo real (segundos de cómputo por segundo de
+    audio). Los spans de etapas en paralelo se solapan en la CPU.
+    """
+
+    enabled = True
+
+    def __init__(self, job_id=None, queue_wait=0.0):
+        self.job_id = job_id
+        self.queue_wait = queue_wait
+        self.spans = []
+        self.counters = {}
+        self.lock = threading.Lock()
+        reset_peak_rss()
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+
+    @contextlib.contextmanager
+    def span(self, name, audio_seconds=None, **fields):
+        """Mide el bloque; el dict que devuelve admite audio_seconds, bytes y otros campos"""
+        record = dict(fields, name=name)
+        if audio_seconds is not None:
+            record['audio_seconds'] = audio_seconds
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except BaseException:
+            record['error'] = True
+            raise
+        finally:
+            record['start'] = round(wall - self.started, 4)
+            record['wall'] = round(time.perf_counter() - wall, 4)
+            record['cpu'] = round(time.process_time() - cpu, 4)
+            if record.get('audio_seconds'):
+                record['rtf'] = round(record['wall'] / record['audio_seconds'], 4)
+            with self.lock:
+                self.spans.append(record)
+
+    def add(self, name, value):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def stages(self):
+        """Resumen por etapa: llamadas, segundos, audio tratado y factor de tiempo real"""
+        stages = {}
+        for record in self.spans:
+            stage = stages.setdefault(record['name'], {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'audio_seconds': 0.0})
+            stage['calls'] += 1
+            stage['wall'] += record['wall']
+            stage['cpu'] += record['cpu']
+            stage['audio_seconds'] += record.get('audio_seconds', 0.0)
+        for stage in stages.values():
+            if stage['audio_seconds']:
+                stage['rtf'] = round(stage['wall'] / stage['audio_seconds'], 4)
+        return stages
+
+    def report(self, error=None):
+        """Informe del trabajo, listo para JSON"""
+        wall = time.perf_counter() - self.started
+        with self.lock:
+            counters = dict(self.counters)
+            spans = sorted(self.spans, key=lambda record: record['start'])
+            stages = self.stages()
+        input_seconds = counters.get('input_seconds', 0.0)
+        return {
+            'job_id': self.job_id,
+            'pid': os.getpid(),
+            'finished_at': time.time(),
+            'status': 'error' if error is not None else 'ok',
+            'error': str(error) if error is not None else None,
+            'queue_wait': round(self.queue_wait, 4),
+            'wall': round(wall, 4),
+            'cpu': round(time.process_time() - self.cpu_started, 4),
+            'rtf': round(wall / input_seconds, 4) if input_seconds else None,
+            'peak_rss_bytes': peak_rss_bytes(),
+            'counters': counters,
+            'stages': stages,
+            'spans': spans,
+        }
+
+def export_report(report, path=METRICS_FILE):
+    """Añade el informe como una línea JSON (una sola escritura, segura entre procesos)"""
+    if not path:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    line = (json.dumps(report, ensure_ascii=False) + "\n").encode('utf-8')
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+@contextlib.contextmanager
+def profile_job(name, enabled=False, directory=PROFILE_DIR):
+    """cProfile del hilo que procesa el trabajo; deja {name}.prof para pstats/snakeviz
+
+    Sólo ve el hilo que lo activa: la síntesis y la mezcla en paralelo aparecen
+    como esperas de sus futures.
+    """
+    if not enabled:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}.prof")
+        profiler.dump_stats(path)
+        print(f"🔬 Perfil del trabajo guardado en {path}")
+
+class MetricsStore:
+    """Acumula los informes de los trabajos en el proceso del bot"""
+
+    def __init__(self, recent=METRICS_RECENT_JOBS):
+        self.lock = threading.Lock()
+        self.jobs = {'ok': 0, 'error': 0}
+        self.totals = {'queue_wait': 0.0, 'wall': 0.0, 'input_seconds': 0.0}
+        self.counters = {}
+        self.stages = {}
+        self.peak_rss_bytes = 0
+        self.recent = deque(maxlen=recent)
+
+    def record(self, report):
+        with self.lock:
+            self.jobs[report['status']] = self.jobs.get(report['status'], 0) + 1
+            self.totals['queue_wait'] += report['queue_wait']
+            self.totals['wall'] += report['wall']
+            self.totals['input_seconds'] += report['counters'].get('input_seconds', 0.0)
+            for name, value in report['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, stage in report['stages'].items():
+                total = self.stages.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'audio_seconds': 0.0})
+                for key in total:
+                    total[key] += stage[key]
+            self.peak_rss_bytes = max(self.peak_rss_bytes, report['peak_rss_bytes'])
+            # Lo reciente sin el detalle de spans, que puede ser largo
+            self.recent.append({key: value for key, value in report.items() if key != 'spans'})
+
+    def prometheus(self):
+        """Métricas en formato de texto de Prometheus"""
+        with self.lock:
+            lines = ["# TYPE dub_jobs_total counter"]
+            lines += [f'dub_jobs_total{{status="{status}"}} {count}' for status, count in self.jobs.items()]
+            lines += [
+                "# TYPE dub_queue_wait_seconds_total counter",
+                f"dub_queue_wait_seconds_total {self.totals['queue_wait']:.4f}",
+                "# TYPE dub_job_seconds_total counter",
+                f"dub_job_seconds_total {self.totals['wall']:.4f}",
+                "# TYPE dub_input_seconds_total counter",
+                f"dub_input_seconds_total {self.totals['input_seconds']:.4f}",
+                "# TYPE dub_peak_rss_bytes gauge",
+                f"dub_peak_rss_bytes {self.peak_rss_bytes}",
+            ]
+            for name, value in sorted(self.counters.items()):
+                if name != 'input_seconds':
+                    lines += [f"# TYPE dub_{name}_total counter", f"dub_{name}_total {value}"]
+            for metric, key in (('calls', 'calls'), ('seconds', 'wall'), ('cpu_seconds', 'cpu'), ('audio_seconds', 'audio_seconds')):
+                lines.append(f"# TYPE dub_stage_{metric}_total counter")
+                lines += [f'dub_stage_{metric}_total{{stage="{name}"}} {stage[key]:g}' for name, stage in sorted(self.stages.items())]
+            lines.append("# TYPE dub_stage_realtime_factor gauge")
+            lines += [
+                f'dub_stage_realtime_factor{{stage="{name}"}} {stage["wall"] / stage["audio_seconds"]:.4f}'
+                for name, stage in sorted(self.stages.items()) if stage['audio_seconds']
+            ]
+            return "\n".join(lines) + "\n"
+
+    def recent_jobs(self):
+        with self.lock:
+            return list(self.recent)
+
+class MetricsServer:
+    """Endpoint HTTP local: /metrics (Prometheus) y /jobs (últimos trabajos en JSON)"""
+
+    def __init__(self, store, port, host="127.0.0.1"):
+        self.store = store
+        self.address = (host, port)
+        self.server = None
+
+    def start(self):
+        store = self.store
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = store.prometheus().encode('utf-8'), 'text/plain; version=0.0.4'
+                elif self.path == '/jobs':
+                    body, content_type = json.dumps(store.recent_jobs(), ensure_ascii=False).encode('utf-8'), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(self.address, Handler)
+        threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True).start()
+        return f"http://{self.address[0]}:{self.server.server_port}/metrics"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
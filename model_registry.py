@@ -0,0 +1,96 @@
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+import soundfile as sf
+from audio_buffer import AudioBuffer
+from config import ASR_MODEL_SIZE, TTS_MODEL, WARMUP_MODELS
+
+MODEL_NAMES = ('asr', 'tts', 'demucs')
+WARMUP_SPEAKER = "__warmup__"
+
+class ModelRegistry:
+    """Modelos pesados de un proceso: se importan y cargan sólo cuando se piden
+
+    status guarda el estado de cada modelo: 'pending', 'loading', 'loaded'
+    (cargado sin probar), 'ready' (ya hizo una inferencia) o 'error'.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._locks = {name: threading.Lock() for name in MODEL_NAMES}
+        self._device = None
+        self.status = {name: 'pending' for name in MODEL_NAMES}
+
+    @property
+    def device(self):
+        if self._device is None:
+            import torch
+            self._device = "cuda" if torch.cuda.is_available() else "cpu"
+        return self._device
+
+    def get(self, name):
+        """Devuelve el modelo, cargándolo la primera vez (seguro entre hilos)"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._locks[name]:
+            if name not in self._models:
+                self.status[name] = 'loading'
+                try:
+                    self._models[name] = getattr(self, f"_load_{name}")()
+                except Exception:
+                    self.status[name] = 'error'
+                    raise
+                self.status[name] = 'loaded'
+        return self._models[name]
+
+    def _load_asr(self):
+        from asr_backends import create_asr_backend
+        asr = create_asr_backend(device=self.device)
+        print(f"🎤 Transcripción con {asr.name} ({ASR_MODEL_SIZE})")
+        return asr
+
+    def _load_tts(self):
+        from TTS.api import TTS
+        from tts_engine import XTTSEngine
+        print(f"🗣️ Cargando XTTS v2 en {self.device}...")
+        return XTTSEngine(TTS(TTS_MODEL).to(self.device))
+
+    def _load_demucs(self):
+        from demucs_engine import DemucsEngine
+        return DemucsEngine(device=self.device)
+
+    def _warm_asr(self, asr):
+        asr.transcribe(np.zeros(16000, dtype=np.float32))
+
+    def _warm_tts(self, engine):
+        # Referencia sintética: sólo importa ejercitar el condicionamiento y la síntesis
+        with tempfile.TemporaryDirectory() as tmp:
+            reference = os.path.join(tmp, "warmup.wav")
+            t = np.arange(3 * 22050) / 22050.0
+            sf.write(reference, (0.1 * np.sin(2 * np.pi * 180 * t)).astype(np.float32), 22050)
+            engine.synthesize("Hola.", 'es', reference, speaker_key=WARMUP_SPEAKER)
+            engine.forget(WARMUP_SPEAKER)
+
+    def _warm_demucs(self, engine):
+        engine.separate(AudioBuffer(np.zeros((engine.rate, engine.channels), dtype=np.float32), engine.rate))
+
+    def warm_up(self, names=WARMUP_MODELS):
+        """Carga los modelos y hace una inferencia de prueba; devuelve {modelo: segundos o error}"""
+        report = {}
+        for name in names:
+            start = time.time()
+            try:
+                getattr(self, f"_warm_{name}")(self.get(name))
+                self.status[name] = 'ready'
+                report[name] = round(time.time() - start, 1)
+            except Exception as e:
+                self.status[name] = 'error'
+                report[name] = f"error: {e}"
+                print(f"⚠️ No se pudo precalentar {name}: {e}")
+        return report
+
+# Registro del proceso; en modo hilo cada worker crea el suyo (los modelos no son seguros entre hilos)
+models = ModelRegistry()
@@ -0,0 +1,89 @@
+import queue
+import threading
+from config import PIPELINE_QUEUE_SIZE
+
+# Marca de fin de la secuencia entre etapas
+_DONE = object()
+
+class StagePipeline:
+    """Etapas en hilos propios unidas por colas acotadas
+
+    Cada etapa es una función elemento -> elemento que procesa los elementos en
+    orden; mientras una etapa trabaja con el tramo N, la anterior ya avanza con
+    el N+1. Las colas acotadas frenan a las etapas rápidas para que no acumulen
+    en memoria tramos que las lentas todavía no pueden procesar.
+    """
+
+    def __init__(self, stages, queue_size=PIPELINE_QUEUE_SIZE):
+        # stages: [(nombre, función)]
+        self.stages = stages
+        self.queue_size = max(1, int(queue_size))
+        self.errors = []
+        self._failed = threading.Event()
+
+    def _get(self, inbox):
+        # Devuelve _DONE en cuanto otra etapa falla, para no quedarse esperando
+        while True:
+            try:
+                return inbox.get(timeout=0.1)
+            except queue.Empty:
+                if self._failed.is_set():
+                    return _DONE
+
+    def _put(self, outbox, item):
+        while True:
+            try:
+                outbox.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if self._failed.is_set():
+                    return False
+
+    def _run_stage(self, name, function, inbox, outbox):
+        while True:
+            item = self._get(inbox)
+            if item is _DONE:
+                break
+            try:
+                result = function(item)
+            except Exception as e:
+                print(f"❌ Falló la etapa {name}: {e}")
+                self.errors.append(e)
+                self._failed.set()
+                break
+            if not self._put(outbox, result):
+                break
+        self._put(outbox, _DONE)
+
+    def _feed(self, items, outbox):
+        for item in items:
+            if not self._put(outbox, item):
+                return
+        self._put(outbox, _DONE)
+
+    def run(self, items):
+        """Pasa items por todas las etapas y devuelve los resultados en orden"""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), name="stage-feed", daemon=True)]
+        for index, (name, function) in enumerate(self.stages):
+            threads.append(threading.Thread(
+                target=self._run_stage,
+                args=(name, function, queues[index], queues[index + 1]),
+                name=f"stage-{name}",
+                daemon=True
+            ))
+        for thread in threads:
+            thread.start()
+
+        results = []
+        while True:
+            item = self._get(queues[-1])
+            if item is _DONE:
+                break
+            results.append(item)
+
+        for thread in threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+        return results
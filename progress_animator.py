@@ -1,12 +1,31 @@
 import asyncio
 import time
+from config import PROGRESS_EDIT_INTERVAL
+
+# Nombre visible de cada etapa que informa VideoProcessor
+STAGE_NAMES = {
+    'extracting': 'Extrayendo audio',
+    'detecting': 'Detectando hablantes',
+    'separating': 'Separando voces y fondo',
+    'emotion': 'Analizando emociones',
+    'transcribing': 'Transcribiendo con Whisper AI',
+    'translating': 'Traduciendo texto',
+    'cloning': 'Clonando voz con emociones',
+    'mixing': 'Mezclando audio',
+    'finalizing': 'Finalizando video'
+}
 
 class ProgressAnimator:
-    def __init__(self):
+    def __init__(self, min_interval=PROGRESS_EDIT_INTERVAL):
+        self.min_interval = min_interval
+        # Por chat: lock y última edición, compartidos por todos sus trabajos para
+        # no superar los límites de Telegram aunque haya varios en marcha
+        self.chats = {}
         self.animations = {
             'extracting': ['🎬', '🎥', '🎞️', '📹', '🎦'],
             'separating': ['🎵', '🎶', '🎼', '🎹', '🎸'],
             'detecting': ['👤', '👥', '👨', '👩', '🧑'],
+            'emotion': ['🎭', '😄', '😢', '😡', '🤩'],
             'transcribing': ['🎤', '🎙️', '📢', '📣', '🔊'],
             'translating': ['🌍', '🌎', '🌏', '🗺️', '🌐'],
             'cloning': ['🎭', '🎪', '🎨', '✨', '⭐'],
@@ -51,17 +70,83 @@ class ProgressAnimator:
         
         return message
     
-    async def animate_progress(self, message_obj, stage, stage_name, duration=3):
-        """Anima el progreso durante una etapa"""
-        steps = 10
-        for i in range(steps + 1):
-            percentage = int((i / steps) * 100)
-            text = self.format_progress_message(stage, stage_name, percentage)
-            
-            try:
-                await message_obj.edit_text(text, parse_mode='Markdown')
-            except:
-                pass
-            
-            if i < steps:
-                await asyncio.sleep(duration / steps)
+    def chat_limiter(self, chat_id):
+        """{'lock', 'last_edit', 'trackers'} del chat, creado la primera vez"""
+        if chat_id not in self.chats:
+            self.chats[chat_id] = {'lock': asyncio.Lock(), 'last_edit': None, 'trackers': 0}
+        return self.chats[chat_id]
+
+    def seconds_until_edit(self, chat_id):
+        """Tiempo que falta para poder editar otro mensaje en el chat"""
+        last = self.chat_limiter(chat_id)['last_edit']
+        if last is None:
+            return 0
+        return max(0, self.min_interval - (time.monotonic() - last))
+
+    def track(self, message_obj, chat_id, details=""):
+        """Empieza a reflejar en message_obj el progreso real de un trabajo"""
+        return ProgressTracker(self, message_obj, chat_id, details)
+
+class ProgressTracker:
+    """Agrupa las actualizaciones de progreso en como mucho una edición por intervalo
+
+    El intervalo es del chat: los trabajos del mismo chat se turnan con su lock
+    y cada uno edita sólo su propio mensaje.
+    """
+
+    def __init__(self, animator, message_obj, chat_id, details=""):
+        self.animator = animator
+        self.message_obj = message_obj
+        self.chat_id = chat_id
+        self.details = details
+        self.latest = None
+        self.shown = None
+        self.limiter = animator.chat_limiter(chat_id)
+        self.limiter['trackers'] += 1
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def update(self, stage, fraction):
+        """Registra el último progreso conocido (no edita el mensaje directamente)"""
+        self.latest = (stage, fraction)
+        self._changed.set()
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            # Un trabajo del chat edita a la vez, y sólo pasado el intervalo desde la última edición
+            async with self.limiter['lock']:
+                await asyncio.sleep(self.animator.seconds_until_edit(self.chat_id))
+                self._changed.clear()
+
+                stage, fraction = self.latest
+                percentage = int(max(0.0, min(1.0, fraction)) * 100)
+                text = self.animator.format_progress_message(
+                    stage, STAGE_NAMES.get(stage, stage), percentage, self.details
+                )
+                if text == self.shown:
+                    continue
+
+                try:
+                    await self.message_obj.edit_text(text, parse_mode='Markdown')
+                    self.shown = text
+                except Exception as e:
+                    # Si Telegram pide esperar, respetarlo antes de la siguiente edición del chat
+                    retry_after = getattr(e, 'retry_after', None)
+                    if retry_after:
+                        if hasattr(retry_after, 'total_seconds'):
+                            retry_after = retry_after.total_seconds()
+                        await asyncio.sleep(float(retry_after))
+                        self._changed.set()
+                self.limiter['last_edit'] = time.monotonic()
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        # El último trabajo del chat se lleva su limitador
+        self.limiter['trackers'] -= 1
+        if not self.limiter['trackers'] and self.animator.chats.get(self.chat_id) is self.limiter:
+            del self.animator.chats[self.chat_id]
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import threading
+import time
+from config import RESULT_INDEX_PATH, RESULT_INDEX_MAX_ENTRIES
+
+class ResultIndex:
+    """Doblajes ya enviados: (video de origen, idioma, fondo) -> file_id de Telegram
+
+    El video de origen se identifica por su file_unique_id, que es el mismo
+    para cualquier usuario que reenvíe el archivo. Con el file_id guardado,
+    Telegram vuelve a mandar el video sin descargar, procesar ni subir nada.
+    """
+
+    def __init__(self, path=RESULT_INDEX_PATH, max_entries=RESULT_INDEX_MAX_ENTRIES):
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "source_id TEXT, target_lang TEXT, keep_background INTEGER, file_id TEXT, "
+                "num_speakers INTEGER, emotion TEXT, used REAL, "
+                "PRIMARY KEY (source_id, target_lang, keep_background))"
+            )
+
+    def get(self, source_id, target_lang, keep_background):
+        """{'file_id', 'num_speakers', 'emotion'} o None"""
+        key = (source_id, target_lang, int(keep_background))
+        with self.lock, self.db:
+            row = self.db.execute(
+                "SELECT file_id, num_speakers, emotion FROM results "
+                "WHERE source_id = ? AND target_lang = ? AND keep_background = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute(
+                "UPDATE results SET used = ? WHERE source_id = ? AND target_lang = ? AND keep_background = ?",
+                (time.time(),) + key
+            )
+        return dict(row)
+
+    def put(self, source_id, target_lang, keep_background, file_id, num_speakers, emotion):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source_id, target_lang, int(keep_background), file_id, num_speakers, emotion, time.time())
+            )
+            # Olvidar los menos pedidos si el índice crece demasiado
+            excess = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.db.execute(
+                    "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY used LIMIT ?)",
+                    (excess,)
+                )
+
+    def remove(self, source_id, target_lang, keep_background):
+        """Quita una entrada cuyo file_id Telegram ya no acepta"""
+        with self.lock, self.db:
+            self.db.execute(
+                "DELETE FROM results WHERE source_id = ? AND target_lang = ? AND keep_background = ?",
+                (source_id, target_lang, int(keep_background))
+            )
@@ -0,0 +1,66 @@
+import numpy as np
+import soundfile as sf
+from audio_buffer import AudioBuffer
+from diarization import SpeakerClusters, SpeakerDiarizer
+
+RATE = 16000
+
+def two_voices():
+    """3 s de un tono grave y 3 s de uno agudo, con volumen variable como la voz"""
+    t = np.arange(3 * RATE) / RATE
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 3 * t)
+    tones = np.concatenate([envelope * np.sin(2 * np.pi * 150 * t), envelope * np.sin(2 * np.pi * 260 * t)])
+    return AudioBuffer(tones.astype(np.float32), RATE)
+
+def voice(pitch, seconds, brightness):
+    """Tono armónico con vibrato y sílabas; brightness controla cuánto pesan los armónicos altos"""
+    t = np.arange(int(seconds * RATE)) / RATE
+    phase = 2 * np.pi * np.cumsum(pitch * (1 + 0.02 * np.sin(2 * np.pi * 5 * t))) / RATE
+    harmonics = sum(brightness ** k * np.sin(k * phase) for k in range(1, 12))
+    syllables = 0.55 + 0.45 * np.sin(2 * np.pi * 4 * t)
+    return (0.3 * syllables * harmonics / np.max(np.abs(harmonics))).astype(np.float32)
+
+def dialogue():
+    """Dos voces distintas que se turnan en tramos de 2 s: A B A B"""
+    low, high = voice(110, 2, 0.8), voice(240, 2, 0.4)
+    audio = AudioBuffer(np.concatenate([low, high, low, high]), RATE)
+    segments = [{'start': 2.0 * index, 'end': 2.0 * index + 2.0} for index in range(4)]
+    return audio, segments
+
+def test_two_voices_get_distinct_speakers():
+    audio, segments = dialogue()
+    assert SpeakerDiarizer().diarize(audio, segments) == 2
+    assert [segment['speaker'] for segment in segments] == [0, 1, 0, 1]
+
+def test_reference_clips_one_file_per_speaker(tmp_path):
+    audio, segments = dialogue()
+    diarizer = SpeakerDiarizer()
+    diarizer.diarize(audio, segments)
+    references = diarizer.reference_clips(audio, segments, str(tmp_path))
+    assert sorted(references) == [0, 1]
+    for path in references.values():
+        info = sf.info(path)
+        assert info.frames > 0
+        # Los dos tramos del hablante y su separación
+        assert info.duration >= 4.0
+
+def test_silent_segment_goes_to_an_existing_speaker():
+    # El último segmento cae fuera del audio: embedding a cero
+    segments = [{'start': 0, 'end': 1.5}, {'start': 1.5, 'end': 3}, {'start': 3, 'end': 4.5}, {'start': 10, 'end': 12}]
+    count = SpeakerDiarizer().diarize(two_voices(), segments)
+    speakers = [segment['speaker'] for segment in segments]
+    assert speakers[3] in speakers[:3]
+    assert count == len(set(speakers))
+
+def test_only_silent_segments_get_speaker_zero():
+    segments = [{'start': 10, 'end': 12}, {'start': 12, 'end': 14}]
+    assert SpeakerDiarizer().diarize(two_voices(), segments) == 1
+    assert [segment['speaker'] for segment in segments] == [0, 0]
+
+def test_online_silent_segment_does_not_create_speaker():
+    diarizer = SpeakerDiarizer()
+    clusters = SpeakerClusters(diarizer.threshold, diarizer.max_speakers)
+    segments = [{'start': 10, 'end': 12}, {'start': 0, 'end': 1.5}, {'start': 12, 'end': 14}]
+    diarizer.diarize_online(two_voices(), segments, clusters)
+    assert [segment['speaker'] for segment in segments] == [0, 0, 0]
+    assert len(clusters) == 1
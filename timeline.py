@@ -0,0 +1,77 @@
+import bisect
+import os
+import numpy as np
+import soundfile as sf
+from audio_buffer import AudioBuffer
+from voice_transform import transform_voice
+from config import MAX_SEGMENT_SPEEDUP
+
+class Timeline:
+    """Clips doblados colocados en su instante original, que se generan por bloques
+
+    Sólo se calcula dónde va cada clip; el audio de un clip se carga cuando un
+    bloque lo necesita, así que la memoria no crece con la duración del video.
+    """
+
+    def __init__(self, clips, rate, duration, max_speedup=MAX_SEGMENT_SPEEDUP):
+        self.rate = rate
+        clips = sorted(clips, key=lambda clip: clip[0])
+        self.placements = []
+        cursor = 0
+
+        for index, (start, path) in enumerate(clips):
+            info = sf.info(path)
+            length = int(np.ceil(info.frames * rate / float(info.samplerate)))
+
+            # Acelerar (como máximo max_speedup) los clips que no caben en su hueco
+            next_start = clips[index + 1][0] if index + 1 < len(clips) else duration
+            slot = int(round((next_start - start) * rate))
+            factor = 1.0
+            if 0 < slot < length:
+                factor = min(length / float(slot), max_speedup)
+                length = int(round(length / factor))
+
+            # Nunca solapar con el clip anterior: si no cabe, se desplaza
+            offset = max(int(round(start * rate)), cursor)
+            self.placements.append((offset, length, path, factor))
+            cursor = offset + length
+
+        self.length = max(int(round(duration * rate)), cursor)
+        self._ends = [offset + length for offset, length, _, _ in self.placements]
+        self._loaded = {}
+
+    def _clip(self, index):
+        if index not in self._loaded:
+            offset, length, path, factor = self.placements[index]
+            samples = AudioBuffer.from_file(path).mono(self.rate)
+            if factor > 1.0:
+                samples = transform_voice(samples, self.rate, speed=factor)
+            samples = samples[:length]
+            if len(samples) < length:
+                samples = np.pad(samples, (0, length - len(samples)))
+            if factor > 1.0:
+                # La mezcla recorre la línea de tiempo dos veces: guardar el clip
+                # ya acelerado para no repetir la transformación en la segunda
+                fast_path = f"{os.path.splitext(path)[0]}_fast.wav"
+                AudioBuffer(samples, self.rate).write(fast_path)
+                self.placements[index] = (offset, length, fast_path, 1.0)
+            self._loaded[index] = samples
+        return self._loaded[index]
+
+    def render(self, start, end):
+        """Audio mono float32 de las muestras [start, end)"""
+        out = np.zeros(end - start, dtype=np.float32)
+        first = bisect.bisect_right(self._ends, start)
+        for index in range(first, len(self.placements)):
+            offset, length, _, _ = self.placements[index]
+            if offset >= end:
+                break
+            samples = self._clip(index)
+            a = max(start, offset)
+            b = min(end, offset + length)
+            out[a - start:b - start] += samples[a - offset:b - offset]
+
+        # Soltar los clips que ya quedaron atrás
+        for index in [index for index in self._loaded if self._ends[index] <= end]:
+            del self._loaded[index]
+        return out
@@ -0,0 +1,187 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import (TRANSLATION_BACKEND, TRANSLATION_WORKERS, TRANSLATION_BATCH_CHARS, TRANSLATION_TIMEOUT,
+                    TRANSLATION_RETRIES, TRANSLATION_CACHE_PATH, TRANSLATION_CACHE_MAX_ENTRIES)
+
+class GoogleBackend:
+    """Google Translate (endpoint público gtx) con una sesión HTTP reutilizada
+
+    Varias frases viajan en una sola petición, separadas por saltos de línea,
+    que Google conserva en la traducción.
+    """
+
+    name = "google"
+    url = "https://translate.googleapis.com/translate_a/single"
+    # Códigos de Whisper que Google escribe de otra forma
+    codes = {'zh': 'zh-CN', 'he': 'iw', 'jw': 'jv'}
+
+    def __init__(self, timeout=TRANSLATION_TIMEOUT, retries=TRANSLATION_RETRIES, pool_size=4 * TRANSLATION_WORKERS):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        self.timeout = timeout
+        self.session = requests.Session()
+        # Reintentos con espera creciente ante límites de tasa y errores del servidor
+        retry = Retry(
+            total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=None, raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+
+    def _request(self, text, source_lang, target_lang):
+        response = self.session.post(
+            self.url,
+            params={
+                'client': 'gtx', 'dt': 't',
+                'sl': self.codes.get(source_lang, source_lang),
+                'tl': self.codes.get(target_lang, target_lang),
+            },
+            data={'q': text},
+            timeout=self.timeout,
+        )
+        if response.status_code != 200:
+            raise Exception(f"Google Translate respondió {response.status_code}")
+        return "".join(part[0] for part in response.json()[0] if part[0])
+
+    def translate_batch(self, texts, source_lang, target_lang):
+        """Traduce varias frases (sin saltos de línea) en una petición"""
+        lines = self._request("\n".join(texts), source_lang, target_lang).split("\n")
+        if len(lines) == len(texts):
+            return [line.strip() for line in lines]
+        # Si Google unió o partió líneas, no se puede saber qué va con qué: una a una
+        return [self._request(text, source_lang, target_lang).strip() for text in texts]
+
+class OfflineBackend:
+    """Sustituto sin red para pruebas: marca el texto con el idioma destino"""
+
+    name = "offline"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def translate_batch(self, texts, source_lang, target_lang):
+        if self.latency:
+            time.sleep(self.latency)
+        return [f"[{target_lang}] {text}" for text in texts]
+
+TRANSLATION_BACKENDS = {
+    GoogleBackend.name: GoogleBackend,
+    OfflineBackend.name: OfflineBackend,
+}
+
+class TranslationCache:
+    """Traducciones ya hechas en SQLite, por (backend, idioma origen, idioma destino, texto)
+
+    Compartida entre workers y reinicios; al superar max_entries se borran
+    las menos usadas recientemente.
+    """
+
+    def __init__(self, path=TRANSLATION_CACHE_PATH, max_entries=TRANSLATION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.db:
+            # WAL: los workers leen mientras otro escribe
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "backend TEXT, source_lang TEXT, target_lang TEXT, text TEXT, translation TEXT, used REAL, "
+                "PRIMARY KEY (backend, source_lang, target_lang, text))"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS translations_used ON translations (used)")
+
+    def get_many(self, backend, source_lang, target_lang, texts):
+        """{texto: traducción} de los textos que ya estaban"""
+        found = {}
+        with self.lock, self.db:
+            for start in range(0, len(texts), 500):
+                chunk = texts[start:start + 500]
+                rows = self.db.execute(
+                    f"SELECT text, translation FROM translations WHERE backend = ? AND source_lang = ? "
+                    f"AND target_lang = ? AND text IN ({', '.join('?' * len(chunk))})",
+                    [backend, source_lang, target_lang] + chunk
+                ).fetchall()
+                found.update(rows)
+            if found:
+                # Marcar como usadas recientemente
+                self.db.executemany(
+                    "UPDATE translations SET used = ? WHERE backend = ? AND source_lang = ? AND target_lang = ? AND text = ?",
+                    [(time.time(), backend, source_lang, target_lang, text) for text in found]
+                )
+        return found
+
+    def put_many(self, backend, source_lang, target_lang, translations):
+        now = time.time()
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)",
+                [(backend, source_lang, target_lang, text, translation, now) for text, translation in translations.items()]
+            )
+            excess = self.db.execute("SELECT COUNT(*) FROM translations").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.db.execute(
+                    "DELETE FROM translations WHERE rowid IN (SELECT rowid FROM translations ORDER BY used LIMIT ?)",
+                    (excess,)
+                )
+
+class TranslationService:
+    """Traduce listas de frases: caché primero, el resto en lotes concurrentes"""
+
+    def __init__(self, backend, cache=None, workers=TRANSLATION_WORKERS, batch_chars=TRANSLATION_BATCH_CHARS):
+        self.backend = backend
+        self.cache = cache
+        self.workers = workers
+        self.batch_chars = batch_chars
+
+    def batches(self, texts):
+        """Agrupa frases hasta batch_chars caracteres por petición"""
+        batch, size = [], 0
+        for text in texts:
+            if batch and size + len(text) + 1 > self.batch_chars:
+                yield batch
+                batch, size = [], 0
+            batch.append(text)
+            size += len(text) + 1
+        if batch:
+            yield batch
+
+    def translate(self, texts, target_lang, source_lang=None):
+        """Traducción de cada texto, en el mismo orden"""
+        source_lang = source_lang or 'auto'
+        # Una línea por frase: los saltos de línea separan las frases dentro de un lote
+        texts = [" ".join(text.split()) for text in texts]
+        unique = list(dict.fromkeys(text for text in texts if text))
+
+        translated = {}
+        if self.cache is not None:
+            translated = self.cache.get_many(self.backend.name, source_lang, target_lang, unique)
+        missing = [text for text in unique if text not in translated]
+
+        if missing:
+            batches = list(self.batches(missing))
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(batches)))) as executor:
+                results = executor.map(
+                    lambda batch: self.backend.translate_batch(batch, source_lang, target_lang), batches
+                )
+                fresh = {text: translation for batch, result in zip(batches, results) for text, translation in zip(batch, result)}
+            if any(not translation for translation in fresh.values()):
+                raise Exception("Error en la traducción")
+            if self.cache is not None:
+                self.cache.put_many(self.backend.name, source_lang, target_lang, fresh)
+            translated.update(fresh)
+
+        return [translated.get(text, "") for text in texts]
+
+def create_translation_service(name=TRANSLATION_BACKEND, cache_path=TRANSLATION_CACHE_PATH):
+    """Servicio de traducción con el backend configurado y la caché persistente"""
+    if name not in TRANSLATION_BACKENDS:
+        raise ValueError(f"Backend de traducción desconocido: {name}")
+    cache = TranslationCache(cache_path) if cache_path else None
+    return TranslationService(TRANSLATION_BACKENDS[name](), cache)
@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+from config import TTS_WORKERS, TTS_LATENT_CACHE_SIZE
+
+# Códigos de idioma que XTTS escribe distinto que el bot
+XTTS_LANGUAGES = {'zh': 'zh-cn'}
+
+class XTTSEngine:
+    """XTTS v2 con el condicionamiento del hablante calculado una sola vez
+
+    Las inferencias se serializan: el GPT de XTTS guarda el prefijo de cada
+    síntesis en el propio módulo, así que dos a la vez se pisarían el texto y
+    la voz. Los workers de síntesis solapan el resto del trabajo de cada clip
+    (condicionamiento, emoción y escritura); el paralelismo real de XTTS viene
+    de tener más workers (procesos), cada uno con su modelo.
+    """
+
+    def __init__(self, tts, workers=TTS_WORKERS, cache_size=TTS_LATENT_CACHE_SIZE):
+        self.model = tts.synthesizer.tts_model
+        self.rate = self.model.config.audio.output_sample_rate
+        self.workers = max(1, int(workers))
+        self.cache_size = cache_size
+        self._latents = OrderedDict()
+        self._lock = threading.Lock()
+        self._inference_lock = threading.Lock()
+
+    def conditioning(self, reference_audio, speaker_key=None):
+        """Latentes del hablante (GPT + embedding), en caché por referencia"""
+        key = speaker_key or reference_audio
+        with self._lock:
+            if key in self._latents:
+                self._latents.move_to_end(key)
+                return self._latents[key]
+
+        latents = self.model.get_conditioning_latents(audio_path=[reference_audio])
+
+        with self._lock:
+            self._latents[key] = latents
+            while len(self._latents) > self.cache_size:
+                self._latents.popitem(last=False)
+        return latents
+
+    def forget(self, speaker_key):
+        with self._lock:
+            self._latents.pop(speaker_key, None)
+
+    def synthesize(self, text, language, reference_audio, speed=1.0, speaker_key=None):
+        """Sintetiza un texto y devuelve float32 mono a self.rate"""
+        gpt_cond_latent, speaker_embedding = self.conditioning(reference_audio, speaker_key)
+        with self._inference_lock, torch.no_grad():
+            out = self.model.inference(
+                text,
+                XTTS_LANGUAGES.get(language, language),
+                gpt_cond_latent,
+                speaker_embedding,
+                speed=speed,
+                enable_text_splitting=True  # Mejor prosodia
+            )
+        wav = out['wav']
+        if torch.is_tensor(wav):
+            wav = wav.cpu().numpy()
+        return np.asarray(wav, dtype=np.float32).reshape(-1)
+
+    def map(self, function, items):
+        """Ejecuta function sobre items usando los workers de síntesis"""
+        if self.workers == 1 or len(items) <= 1:
+            return [function(item) for item in items]
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='tts') as executor:
+            return list(executor.map(function, items))
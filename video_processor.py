@@ -1,130 +1,571 @@
+import bisect
 import os
-import subprocess
-from deep_translator import GoogleTranslator
-import whisper
-from TTS.api import TTS
-import torch
-from pydub import AudioSegment
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from audio_separator import AudioSeparator
 from emotion_detector import EmotionDetector
+from diarization import SpeakerDiarizer, SpeakerClusters
+from workspace import JobWorkspace
+from audio_buffer import AudioBuffer
+from timeline import Timeline
+from ffmpeg_io import decode_streams, mux_writer
+from model_registry import models as default_models
+from artifact_cache import ArtifactCache
+from pipeline import StagePipeline
+from metrics import NULL_METRICS
+from translation import create_translation_service
+from config import OUTPUT_SAMPLE_RATE, VAD_JOIN_GAP_SECONDS
+from config import PIPELINE_MIN_SECONDS, SEPARATION_OVERLAP_SECONDS
+
+# Peso aproximado de cada etapa en la duración total de un trabajo
+PROGRESS_STAGES = [
+    ('extracting', 0.03),
+    ('detecting', 0.02),
+    ('separating', 0.25),
+    ('emotion', 0.03),
+    ('transcribing', 0.15),
+    ('translating', 0.05),
+    ('cloning', 0.40),
+    ('mixing', 0.04),
+    ('finalizing', 0.03),
+]
+
+class StageProgress:
+    """Convierte (etapa, avance dentro de la etapa) en el avance total del trabajo"""
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.ranges = {}
+        start = 0.0
+        for stage, weight in PROGRESS_STAGES:
+            self.ranges[stage] = (start, weight)
+            start += weight
+
+    def __call__(self, stage, done=0.0):
+        if self.callback is None:
+            return
+        start, weight = self.ranges[stage]
+        self.callback(stage, start + weight * max(0.0, min(1.0, done)))
+
+class OverlapProgress(StageProgress):
+    """Progreso cuando varias etapas avanzan a la vez (un tramo en cada una)
+
+    Cada etapa aporta su peso por la fracción que lleva hecha, así el total
+    nunca retrocede aunque los avisos lleguen intercalados.
+    """
+
+    def __init__(self, callback=None, completed=()):
+        super().__init__(callback)
+        self.done = {stage: 1.0 for stage in completed}
+        self.lock = threading.Lock()
+
+    def __call__(self, stage, done=0.0):
+        if self.callback is None:
+            return
+        with self.lock:
+            self.done[stage] = max(self.done.get(stage, 0.0), max(0.0, min(1.0, done)))
+            total = sum(weight * self.done.get(name, 0.0) for name, (_, weight) in self.ranges.items())
+        self.callback(stage, total)
 
 class VideoProcessor:
-    def __init__(self):
-        print("🚀 Cargando modelos de IA avanzados...")
-        self.whisper_model = whisper.load_model("medium")  # Mejor modelo
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"💻 Usando dispositivo: {self.device}")
-        self.tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2").to(self.device)
-        self.audio_separator = AudioSeparator()
+    def __init__(self, models=None):
+        # Los modelos se cargan en el registro la primera vez que se usan (o al precalentar)
+        self.models = models or default_models
+        print(f"💻 Usando dispositivo: {self.models.device}")
+        self.audio_separator = AudioSeparator(self.models)
         self.emotion_detector = EmotionDetector()
-        print("✅ Modelos cargados - Calidad PREMIUM")
+        self.diarizer = SpeakerDiarizer()
+        self.artifact_cache = ArtifactCache()
+        self.translator = create_translation_service()
+        # Métricas del trabajo en curso (un worker procesa un trabajo a la vez)
+        self.metrics = NULL_METRICS
+        # Si el último trabajo reutilizó el análisis de la caché de artefactos
+        self.cache_hit = False
+    
+    @property
+    def device(self):
+        return self.models.device
+    
+    @property
+    def asr(self):
+        return self.models.get('asr')
+    
+    @property
+    def tts_engine(self):
+        return self.models.get('tts')
         
-    def extract_audio(self, video_path, audio_path):
-        subprocess.run(['ffmpeg', '-i', video_path, '-vn', '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', audio_path, '-y'], 
-                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        audio = AudioSegment.from_wav(audio_path)
-        return len(audio) / 1000.0
+    def extract_audio(self, video_path):
+        """Estéreo a OUTPUT_SAMPLE_RATE (separación y mezcla) más mono a 16 kHz (Whisper)"""
+        # Un solo demux y decodificado; PCM float32 por tuberías, sin WAV intermedio
+        with self.metrics.span('decoding') as span:
+            audio, analysis = decode_streams(video_path, [(OUTPUT_SAMPLE_RATE, 2), (16000, 1)])
+            audio.add_view(analysis.mono(), 16000, mono=True)
+            span['audio_seconds'] = audio.duration
+            span['bytes'] = audio.samples.nbytes + analysis.samples.nbytes
+        self.metrics.add('bytes_decoded', span['bytes'])
+        return audio
     
-    def transcribe_audio(self, audio_path):
-        result = self.whisper_model.transcribe(audio_path, fp16=False)
-        text = result['text'].strip()
+    def transcribe_audio(self, audio, regions=None, language=None, require_speech=True):
+        # Whisper trabaja con float32 mono a 16 kHz
+        rate = 16000
+        samples = AudioBuffer.load(audio).mono(rate)
+        if regions is None:
+            regions = [(0.0, len(samples) / rate)]
+        if not regions:
+            if require_speech:
+                raise Exception("No se detectó voz en el audio")
+            return [], language
+        
+        # Transcribir sólo los tramos con voz, pegados con un silencio corto entre ellos
+        gap = np.zeros(int(VAD_JOIN_GAP_SECONDS * rate), dtype=np.float32)
+        pieces = []
+        compact_starts = []
+        position = 0
+        for start, end in regions:
+            piece = samples[int(start * rate):int(end * rate)]
+            compact_starts.append(position / rate)
+            pieces.extend([piece, gap])
+            position += len(piece) + len(gap)
+        
+        def to_source_time(t):
+            index = max(0, bisect.bisect_right(compact_starts, t) - 1)
+            return regions[index][0] + (t - compact_starts[index])
+        
+        samples = np.concatenate(pieces)
+        with self.metrics.span('asr', len(samples) / rate, backend=self.asr.name):
+            result = self.asr.transcribe(samples, language=language)
         language = result['language']
         
-        if not text:
+        # Conservar los tiempos de cada segmento (en el audio original) para colocar el doblaje
+        segments = []
+        for segment in result['segments']:
+            text = segment['text'].strip()
+            if text:
+                segments.append({
+                    'start': float(to_source_time(segment['start'])),
+                    'end': float(to_source_time(segment['end'])),
+                    'text': text
+                })
+        
+        if not segments and require_speech:
             raise Exception("No se detectó voz en el audio")
         
-        return text, language
+        return segments, language
     
-    def translate_text(self, text, target_lang):
-        translator = GoogleTranslator(source='auto', target=target_lang)
-        return translator.translate(text)
+    def translate_segments(self, texts, target_lang, source_lang=None):
+        """Traduce los segmentos en lotes concurrentes, reutilizando las traducciones en caché"""
+        translations = self.translator.translate(texts, target_lang, source_lang)
+        if any(not translation for translation in translations):
+            raise Exception("Error en la traducción")
+        return translations
     
-    def synthesize_speech(self, text, target_lang, output_path, reference_audio, emotion_params=None):
-        # XTTS v2 clona la voz con parámetros emocionales
-        temp_output = "temp_synthesis.wav"
-        
-        # Mejorar calidad de síntesis
-        self.tts.tts_to_file(
-            text=text,
-            speaker_wav=reference_audio,
-            language=target_lang,
-            file_path=temp_output,
-            speed=emotion_params.get('speed', 1.0) if emotion_params else 1.0,
-            split_sentences=True  # Mejor prosodia
-        )
+    def synthesize_speech(self, text, target_lang, output_path, reference_audio, emotion_params=None, speaker_key=None):
+        # XTTS v2 clona la voz con parámetros emocionales (latentes en caché)
+        speed = emotion_params.get('speed', 1.0) if emotion_params else 1.0
+        with self.metrics.span('tts', language=target_lang, chars=len(text)) as span:
+            wav = self.tts_engine.synthesize(text, target_lang, reference_audio, speed=speed, speaker_key=speaker_key)
+            speech = AudioBuffer(wav, self.tts_engine.rate)
+            span['audio_seconds'] = speech.duration
         
         # Aplicar ajustes emocionales
-        if emotion_params:
-            self.emotion_detector.apply_emotion_to_audio(temp_output, output_path, emotion_params)
-            if os.path.exists(temp_output):
-                os.remove(temp_output)
-        else:
-            os.rename(temp_output, output_path)
-    
-    def process_video(self, video_path, target_lang, output_path, keep_background=True, progress_callback=None):
-        temp_audio = "temp_audio.wav"
-        vocals_audio = "vocals.wav"
-        background_audio = "background.wav"
-        dubbed_vocals = "dubbed_vocals.wav"
-        final_audio = "final_audio.wav"
+        with self.metrics.span('apply_emotion', speech.duration):
+            if emotion_params:
+                self.emotion_detector.apply_emotion_to_audio(speech, output_path, emotion_params)
+            else:
+                speech.write(output_path)
+    
+    def synthesize_segments(self, segments, translations, references, emotion_params, workspace, progress=None, prefix=""):
+        """Sintetiza cada segmento de cada idioma en su propio clip; los ya hechos se reutilizan
         
-        try:
-            print("🎬 Extrayendo audio del video...")
-            self.extract_audio(video_path, temp_audio)
-            
-            # Detectar número de hablantes
-            num_speakers = self.audio_separator.detect_speakers(temp_audio)
-            print(f"👥 Detectados {num_speakers} hablante(s) en el video")
-            
-            # Separar voces del fondo
-            print("🎵 Separando voces del audio de fondo...")
+        references es {hablante: referencia de voz}; cada frase se clona con la de su hablante.
+        """
+        progress = progress or StageProgress()
+        clips = {}
+        pending = []
+        for target_lang, texts in translations.items():
+            clips_dir = workspace.subdir(f"clips_{target_lang}")
+            clips[target_lang] = []
+            for index, (segment, text) in enumerate(zip(segments, texts)):
+                clip_path = os.path.join(clips_dir, f"{prefix}{index:04d}.wav")
+                if not os.path.exists(clip_path):
+                    # Cada frase usa su propia emoción si se detectó
+                    params = self.emotion_detector.emotions.get(segment.get('emotion'), emotion_params)
+                    pending.append((target_lang, text, clip_path, params, references[segment.get('speaker', 0)]))
+                clips[target_lang].append((segment['start'], clip_path))
+        
+        total = sum(len(lang_clips) for lang_clips in clips.values())
+        finished = [total - len(pending)]
+        lock = threading.Lock()
+        progress('cloning', finished[0] / max(total, 1))
+        
+        def synthesize_clip(item):
+            target_lang, text, clip_path, params, reference_audio = item
+            partial_path = os.path.splitext(clip_path)[0] + "_partial.wav"
+            self.synthesize_speech(text, target_lang, partial_path, reference_audio, params)
+            os.replace(partial_path, clip_path)
+            with lock:
+                finished[0] += 1
+                progress('cloning', finished[0] / total)
+        
+        if pending:
+            # Condicionar a cada hablante una vez; todos los idiomas comparten los mismos workers
+            self.tts_engine.map(self.tts_engine.conditioning, sorted({item[4] for item in pending}))
+            self.tts_engine.map(synthesize_clip, pending)
+        return clips
+    
+    def load_cached_source(self, cache_key):
+        """Análisis ya guardado en caché para este contenido, o None"""
+        cached = self.artifact_cache.get(cache_key)
+        if not cached:
+            return None
+        
+        print("♻️ Reutilizando separación, emociones y transcripción en caché...")
+        source = dict(cached['meta'])
+        source['vocals'] = AudioBuffer.from_file(cached['files']['vocals'])
+        source['background'] = AudioBuffer.from_file(cached['files']['background'])
+        return source
+    
+    def store_source(self, cache_key, source, workspace):
+        """Guarda en caché los stems y el análisis, que no dependen del idioma destino"""
+        # FLAC para que los stems ocupen poco en la caché
+        vocals, background = source['vocals'], source['background']
+        with self.metrics.span('caching', source['duration']) as span:
+            files = {
+                'vocals': AudioBuffer(vocals.samples, vocals.rate).write(workspace.file("cache_vocals.flac")),
+                'background': AudioBuffer(background.samples, background.rate).write(workspace.file("cache_background.flac")),
+            }
+            span['bytes'] = sum(os.path.getsize(path) for path in files.values())
+            self.artifact_cache.put(
+                cache_key, files,
+                {key: value for key, value in source.items() if key not in ('vocals', 'background')}
+            )
+        self.metrics.add('bytes_written', span['bytes'])
+    
+    def detect_activity(self, audio):
+        """Energía por ventanas (para cortar los tramos entre frases), sobre la vista a 16 kHz ya decodificada"""
+        with self.metrics.span('activity', audio.duration):
+            return self.audio_separator.analyze_activity(AudioBuffer(audio.mono(16000), 16000))
+    
+    def analyze_audio(self, audio, progress=None):
+        """Etapas que no dependen del idioma destino, sobre el audio completo"""
+        progress = progress or StageProgress()
+        
+        # Separar voces del fondo
+        print("🎵 Separando voces del audio de fondo...")
+        progress('separating')
+        with self.metrics.span('separating', audio.duration):
             vocals_audio, background_audio = self.audio_separator.separate_vocals_background(
-                temp_audio, "./temp"
+                audio, None, lambda done, total: progress('separating', done / total)
             )
+        
+        # Detectar emoción en la voz original
+        print("🎭 Analizando emociones en la voz...")
+        progress('emotion')
+        with self.metrics.span('emotion', audio.duration):
+            emotion_features = self.emotion_detector.extract_features(vocals_audio)
+        emotion, emotion_params = self.emotion_detector.analyze_emotion(vocals_audio, emotion_features)
+        
+        # Whisper sólo escucha los tramos con voz; música y silencios pasan tal cual
+        speech_regions = self.audio_separator.speech_regions(vocals_audio)
+        
+        print("🎤 Transcribiendo con Whisper AI...")
+        progress('transcribing')
+        segments, language = self.transcribe_audio(vocals_audio, speech_regions)
+        # Emoción propia de cada frase, con las mismas características ya calculadas
+        self.emotion_detector.label_segments(emotion_features, segments)
+        
+        # Quién dice cada frase, para clonar cada voz por separado
+        print("👥 Identificando hablantes...")
+        with self.metrics.span('diarizing', audio.duration):
+            num_speakers = self.diarizer.diarize(vocals_audio, segments)
+        print(f"👥 Detectados {num_speakers} hablante(s) en el video")
+        progress('transcribing', 1.0)
+        
+        return {
+            'duration': audio.duration,
+            'num_speakers': num_speakers,
+            'speech_regions': speech_regions,
+            'emotion': emotion,
+            'emotion_params': emotion_params,
+            'segments': segments,
+            'language': language,
+            'vocals': vocals_audio,
+            'background': background_audio,
+        }
+    
+    def dub_in_chunks(self, audio, activity, target_langs, workspace, progress=None):
+        """Separación, transcripción, traducción y síntesis por tramos, con las etapas solapadas
+        
+        Mientras un tramo se transcribe, el siguiente ya se está separando y el
+        anterior sintetizando. Devuelve (source, clips) igual que el camino completo.
+        """
+        progress = progress or StageProgress()
+        chunks = self.audio_separator.chunk_boundaries(activity, audio.duration)
+        total = len(chunks)
+        overlap = OverlapProgress(progress.callback, completed=('extracting', 'detecting'))
+        state = {
+            'language': None, 'vocals': None, 'background': None, 'rate': None,
+            'speakers': SpeakerClusters(), 'references': {},
+        }
+        print(f"🧩 Procesando {total} tramo(s) con las etapas solapadas...")
+        
+        def chunk_progress(index):
+            return lambda stage, done=0.0: overlap(stage, (index + done) / total)
+        
+        def place(key, stem, start, end, piece_start):
+            """Copia la parte [start, end) del stem del tramo en el stem completo"""
+            rate = state['rate'] = stem.rate
+            offset = int(round(start * rate))
+            skip = int(round((start - piece_start) * rate))
+            data = stem.samples[skip:skip + int(round(end * rate)) - offset]
+            if state[key] is None:
+                state[key] = np.zeros((int(round(audio.duration * rate)), stem.channels), dtype=np.float32)
+            if data.shape[1] > state[key].shape[1]:
+                data = data.mean(axis=1, keepdims=True)
+            state[key][offset:offset + len(data)] = data
+            return AudioBuffer(data, rate)
+        
+        def separate(item):
+            index, start, end = item['index'], item['start'], item['end']
+            # Algo de contexto a cada lado evita artefactos de Demucs en los cortes
+            piece_start = max(0.0, start - SEPARATION_OVERLAP_SECONDS)
+            piece_end = min(audio.duration, end + SEPARATION_OVERLAP_SECONDS)
+            piece = AudioBuffer(audio.samples[int(round(piece_start * audio.rate)):int(round(piece_end * audio.rate))], audio.rate)
+            with self.metrics.span('separating', piece.duration, chunk=index):
+                vocals, background = self.audio_separator.separate_vocals_background(
+                    piece, None, lambda done, count: overlap('separating', (index + done / count) / total)
+                )
+            item['vocals'] = place('vocals', vocals, start, end, piece_start)
+            place('background', background, start, end, piece_start)
+            return item
+        
+        def transcribe(item):
+            index, start = item['index'], item['start']
+            vocals = item.pop('vocals')
+            with self.metrics.span('emotion', vocals.duration, chunk=index):
+                item['features'] = self.emotion_detector.extract_features(vocals)
+            overlap('emotion', (index + 1) / total)
             
-            # Detectar emoción en la voz original
-            print("🎭 Analizando emociones en la voz...")
-            emotion, emotion_params = self.emotion_detector.analyze_emotion(vocals_audio)
-            
-            print("🎤 Transcribiendo con Whisper AI...")
-            text, source_lang = self.transcribe_audio(vocals_audio)
+            regions = self.audio_separator.speech_regions(vocals)
+            # El idioma del primer tramo con voz se fija para los demás
+            segments, language = self.transcribe_audio(vocals, regions, state['language'], require_speech=False)
+            state['language'] = state['language'] or (language if segments else None)
+            self.emotion_detector.label_segments(item['features'], segments)
             
-            if not text or len(text.strip()) == 0:
-                raise Exception("No se detectó voz en el audio")
+            # Hablantes contra los ya vistos; la referencia de cada uno sale del primer tramo en que habla
+            with self.metrics.span('diarizing', vocals.duration, chunk=index):
+                self.diarizer.diarize_online(vocals, segments, state['speakers'])
+            state['references'].update(self.diarizer.reference_clips(
+                vocals, segments, workspace.subdir("speakers"), skip=state['references']
+            ))
+            for segment in segments:
+                segment['start'] += start
+                segment['end'] += start
+            item['segments'] = segments
+            item['regions'] = [(region_start + start, region_end + start) for region_start, region_end in regions]
+            overlap('transcribing', (index + 1) / total)
+            return item
+        
+        def translate(item):
+            index = item['index']
+            if item['segments']:
+                item['translations'] = self.translate_languages(
+                    item['segments'], target_langs, workspace, chunk_progress(index), suffix=f"_{index:03d}",
+                    source_lang=state['language']
+                )
+            else:
+                item['translations'] = {target_lang: [] for target_lang in target_langs}
+            overlap('translating', (index + 1) / total)
+            return item
+        
+        def synthesize(item):
+            index = item['index']
+            if item['segments']:
+                # Emoción del tramo para las frases que no tengan la suya
+                chunk_emotion, _ = self.emotion_detector.classify(item['features'])
+                item['clips'] = self.synthesize_segments(
+                    item['segments'], item['translations'], dict(state['references']),
+                    self.emotion_detector.emotions[chunk_emotion], workspace, chunk_progress(index),
+                    prefix=f"{index:03d}_"
+                )
+            else:
+                item['clips'] = {target_lang: [] for target_lang in target_langs}
+            overlap('cloning', (index + 1) / total)
+            return item
+        
+        pipeline = StagePipeline([
+            ('separating', separate),
+            ('transcribing', transcribe),
+            ('translating', translate),
+            ('cloning', synthesize),
+        ])
+        try:
+            results = pipeline.run([
+                {'index': index, 'start': start, 'end': end}
+                for index, (start, end) in enumerate(chunks)
+            ])
+        finally:
+            for reference in state['references'].values():
+                self.tts_engine.forget(reference)
+        
+        segments = [segment for item in results for segment in item['segments']]
+        if not segments:
+            raise Exception("No se detectó voz en el audio")
+        
+        print(f"👥 Detectados {len(state['speakers'])} hablante(s) en el video")
+        print("🎭 Analizando emociones en la voz...")
+        emotion_features = self.emotion_detector.merge_features([item['features'] for item in results])
+        emotion, emotion_params = self.emotion_detector.analyze_emotion(None, emotion_features)
+        
+        source = {
+            'duration': audio.duration,
+            'num_speakers': len(state['speakers']),
+            'speech_regions': [region for item in results for region in item['regions']],
+            'emotion': emotion,
+            'emotion_params': emotion_params,
+            'segments': segments,
+            'language': state['language'],
+            'vocals': AudioBuffer(state['vocals'], state['rate']),
+            'background': AudioBuffer(state['background'], state['rate']),
+        }
+        clips = {
+            target_lang: [clip for item in results for clip in item['clips'][target_lang]]
+            for target_lang in target_langs
+        }
+        return source, clips
+    
+    def translate_languages(self, segments, target_langs, workspace, progress=None, suffix="", source_lang=None):
+        """Traduce los segmentos a todos los idiomas en paralelo, guardando cada resultado"""
+        progress = progress or StageProgress()
+        texts = [segment['text'] for segment in segments]
+        finished = []
+        progress('translating')
+        
+        def translate_language(target_lang):
+            # Las traducciones guardadas permiten reanudar un trabajo interrumpido
+            state_name = f"translations_{target_lang}{suffix}.json"
+            translations = workspace.load_json(state_name)
+            if translations is None:
+                print(f"🌍 Traduciendo a {target_lang}...")
+                with self.metrics.span('translating', language=target_lang, segments=len(texts)):
+                    translations = self.translate_segments(texts, target_lang, source_lang)
+                workspace.save_json(state_name, translations)
+            finished.append(target_lang)
+            progress('translating', len(finished) / len(target_langs))
+            return target_lang, translations
+        
+        with ThreadPoolExecutor(max_workers=len(target_langs)) as executor:
+            return dict(executor.map(translate_language, target_langs))
+    
+    def finish_language(self, video_path, source, clips, target_lang, output_path, keep_background, workspace, progress=None):
+        """Línea de tiempo, mezcla y video final de un idioma
+
+        progress() se llama al terminar el video (la mezcla se codifica en él).
+        """
+        progress = progress or (lambda: None)
+        # Cada clip en su instante original; se genera por bloques al mezclar
+        dubbed = Timeline(clips, OUTPUT_SAMPLE_RATE, source['duration'])
+        
+        # La mezcla se codifica directamente en el video final, sin WAV intermedio
+        output = mux_writer(video_path, output_path)
+        with self.metrics.span('mixing', source['duration'], language=target_lang) as span:
+            if keep_background and source['background'] is not None:
+                print(f"🎚️ [{target_lang}] Mezclando voces dobladas con audio de fondo (50% volumen)...")
+                self.audio_separator.mix_audio(dubbed, source['background'], output, 0.5)
+            else:
+                print(f"🔇 [{target_lang}] Generando sin audio de fondo...")
+                self.audio_separator.mix_audio(dubbed, None, output)
+            span['bytes'] = os.path.getsize(output_path)
+        self.metrics.add('bytes_written', span['bytes'])
+        print(f"🎬 [{target_lang}] Video final generado")
+        progress()
+        return output_path
+    
+    def process_video_multi(self, video_path, output_paths, keep_background=True, progress_callback=None, job_id=None,
+                            metrics=None):
+        """Dobla un video a varios idiomas; output_paths es {idioma: ruta de salida}
+        
+        metrics (JobMetrics) recibe los tiempos de cada etapa; sin él no se mide nada.
+        """
+        self.metrics = metrics or NULL_METRICS
+        target_langs = list(output_paths)
+        progress = StageProgress(progress_callback)
+        with JobWorkspace(job_id=job_id) as workspace:
+            # Mitad común: extracción, separación, emociones y transcripción una sola vez
+            progress('extracting')
+            cache_key = self.artifact_cache.content_key(video_path)
+            source = self.load_cached_source(cache_key)
+            self.cache_hit = source is not None
+            clips = None
             
-            print(f"📝 Detectado ({source_lang}): '{text[:60]}...'")
-            print(f"🌍 Traduciendo a {target_lang}...")
-            translated_text = self.translate_text(text, target_lang)
+            if source is None:
+                print("🎬 Extrayendo audio del video...")
+                audio = self.extract_audio(video_path)
+                if audio.duration >= PIPELINE_MIN_SECONDS:
+                    # Videos largos: por tramos, con la síntesis ya en marcha durante la separación
+                    progress('detecting')
+                    activity = self.detect_activity(audio)
+                    source, clips = self.dub_in_chunks(audio, activity, target_langs, workspace, progress)
+                else:
+                    source = self.analyze_audio(audio, progress)
+                self.store_source(cache_key, source, workspace)
+            if clips is None:
+                # Por tramos el progreso ya va por la síntesis: marcar la transcripción lo haría retroceder
+                progress('transcribing', 1.0)
+            self.metrics.add('input_seconds', source['duration'])
             
-            if not translated_text:
-                raise Exception("Error en la traducción")
+            num_speakers, emotion = source['num_speakers'], source['emotion']
+            segments, source_lang = source['segments'], source['language']
+            text = " ".join(segment['text'] for segment in segments)
+            print(f"📝 Detectado ({source_lang}): '{text[:60]}...' en {len(segments)} segmento(s)")
             
-            print(f"✨ CLONANDO VOZ con emoción {emotion.upper()}...")
-            self.synthesize_speech(translated_text, target_lang, dubbed_vocals, vocals_audio, emotion_params)
+            if clips is None:
+                translations = self.translate_languages(segments, target_langs, workspace, progress, source_lang=source_lang)
+                
+                print(f"✨ CLONANDO VOZ con emoción {emotion.upper()} en {', '.join(target_langs)}...")
+                # Una referencia de voz por hablante, con sólo sus frases
+                references = self.diarizer.reference_clips(source['vocals'], segments, workspace.subdir("speakers"))
+                try:
+                    with self.metrics.span('cloning', languages=len(target_langs)):
+                        clips = self.synthesize_segments(
+                            segments, translations, references, source['emotion_params'], workspace, progress
+                        )
+                finally:
+                    for reference in references.values():
+                        self.tts_engine.forget(reference)
             
-            # Mezclar con fondo si se solicita
-            if keep_background and os.path.exists(background_audio):
-                print("🎚️ Mezclando voces dobladas con audio de fondo (50% volumen)...")
-                self.audio_separator.mix_audio(dubbed_vocals, background_audio, final_audio, 0.5)
-            else:
-                print("🔇 Generando sin audio de fondo...")
-                final_audio = dubbed_vocals
+            # Cada idioma mezcla y monta seguido: el idioma k de n lleva la barra a k/n
+            # del tramo conjunto de ambas etapas, así el total nunca retrocede
+            finished = [0]
+            lock = threading.Lock()
+            mixing_weight = progress.ranges['mixing'][1]
+            finalizing_weight = progress.ranges['finalizing'][1]
             
-            print("🎬 Generando video final...")
-            self.merge_audio_video(video_path, final_audio, output_path)
+            def finish_progress():
+                with lock:
+                    finished[0] += 1
+                    done = (mixing_weight + finalizing_weight) * finished[0] / len(target_langs)
+                    if done <= mixing_weight:
+                        progress('mixing', done / mixing_weight)
+                    else:
+                        progress('finalizing', (done - mixing_weight) / finalizing_weight)
             
-            self.cleanup([temp_audio, vocals_audio, background_audio, dubbed_vocals, final_audio])
+            progress('mixing')
+            with ThreadPoolExecutor(max_workers=len(target_langs)) as executor:
+                futures = {
+                    target_lang: executor.submit(
+                        self.finish_language, video_path, source, clips[target_lang],
+                        target_lang, output_paths[target_lang], keep_background, workspace, finish_progress
+                    )
+                    for target_lang in target_langs
+                }
+                results = {target_lang: future.result() for target_lang, future in futures.items()}
             
-            return output_path, num_speakers, emotion
-        except Exception as e:
-            self.cleanup([temp_audio, vocals_audio, background_audio, dubbed_vocals, final_audio])
-            raise e
-    
-    def merge_audio_video(self, video_path, audio_path, output_path):
-        subprocess.run(['ffmpeg', '-i', video_path, '-i', audio_path, '-c:v', 'copy', '-map', '0:v:0', '-map', '1:a:0', '-shortest', output_path, '-y'],
-                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    
-    def cleanup(self, files):
-        for file in files:
-            if os.path.exists(file):
-                os.remove(file)
+            return results, num_speakers, emotion
+    
+    def process_video(self, video_path, target_lang, output_path, keep_background=True, progress_callback=None, job_id=None):
+        results, num_speakers, emotion = self.process_video_multi(
+            video_path, {target_lang: output_path}, keep_background, progress_callback, job_id
+        )
+        return results[target_lang], num_speakers, emotion
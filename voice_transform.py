@@ -0,0 +1,144 @@
+import numpy as np
+from scipy import fft
+from scipy.signal import get_window
+
+class VoiceTransform:
+    """Cambia velocidad, tono y ganancia en una sola pasada de vocoder de fase
+
+    El tono se desplaza recortando (o ampliando) el espectro de cada trama
+    antes de la IFFT, así que no hace falta un remuestreo aparte. Funciona por
+    bloques: process() devuelve las muestras ya terminadas y flush() el resto.
+    """
+
+    def __init__(self, speed=1.0, pitch_steps=0.0, gain=1.0, n_fft=2048):
+        self.speed = float(speed)
+        self.gain = float(gain)
+        self.n_fft = n_fft
+        self.hop = n_fft // 4
+
+        # Trama de salida más corta (tono más agudo) o más larga (más grave)
+        ratio = 2.0 ** (pitch_steps / 12.0)
+        self.out_fft = max(16, 4 * int(round(n_fft / (4.0 * ratio))))
+        self.out_hop = self.out_fft // 4
+        self.ratio = n_fft / float(self.out_fft)
+        # Tramas de entrada que avanza cada trama de salida
+        self.step = self.speed / self.ratio
+
+        self.window = get_window('hann', n_fft).astype(np.float32)
+        self.out_window = get_window('hann', self.out_fft).astype(np.float32)
+        self.out_bins = self.out_fft // 2 + 1
+        self.keep_bins = min(n_fft // 2 + 1, self.out_bins)
+        self.scale = (self.out_fft / float(n_fft)) / (np.sum(self.out_window ** 2) / self.out_hop) * self.gain
+        self.phase_advance = (2 * np.pi * self.hop / n_fft) * np.arange(n_fft // 2 + 1)
+
+        # Relleno inicial para que la primera trama quede centrada en la muestra 0
+        self._input = np.zeros(n_fft // 2, dtype=np.float32)
+        self._input_offset = 0
+        self._spectra = {}
+        self._time = 0.0
+        self._phase = None
+        self._output = np.zeros(0, dtype=np.float32)
+        self._output_start = 0
+        self._out_frames = 0
+        self._skip = self.out_fft // 2
+        self._consumed = 0
+        self._emitted = 0
+        self._limit = None
+
+    def _spectrum(self, index):
+        spectrum = self._spectra.get(index)
+        if spectrum is None:
+            start = index * self.hop - self._input_offset
+            spectrum = fft.rfft(self._input[start:start + self.n_fft] * self.window)
+            self._spectra[index] = spectrum
+        return spectrum
+
+    def _available_frames(self):
+        total = self._input_offset + len(self._input)
+        return 0 if total < self.n_fft else (total - self.n_fft) // self.hop + 1
+
+    def _overlap_add(self, frame):
+        start = self._out_frames * self.out_hop - self._output_start
+        end = start + self.out_fft
+        if end > len(self._output):
+            self._output = np.concatenate([self._output, np.zeros(end - len(self._output), dtype=np.float32)])
+        self._output[start:end] += frame
+        self._out_frames += 1
+
+    def _run(self):
+        available = self._available_frames()
+        while int(self._time) + 1 < available:
+            index = int(self._time)
+            alpha = self._time - index
+            current = self._spectrum(index)
+            following = self._spectrum(index + 1)
+            if self._phase is None:
+                self._phase = np.angle(current)
+
+            magnitude = (1.0 - alpha) * np.abs(current) + alpha * np.abs(following)
+            spectrum = np.zeros(self.out_bins, dtype=np.complex64)
+            spectrum[:self.keep_bins] = (magnitude * np.exp(1j * self._phase))[:self.keep_bins]
+            frame = fft.irfft(spectrum, n=self.out_fft).astype(np.float32) * self.out_window * self.scale
+            self._overlap_add(frame)
+
+            # Avance de fase por bin, como en librosa.phase_vocoder
+            delta = np.angle(following) - np.angle(current) - self.phase_advance
+            delta -= 2 * np.pi * np.round(delta / (2 * np.pi))
+            self._phase = np.mod(self._phase + self.phase_advance + delta, 2 * np.pi)
+            self._time += self.step
+
+        # Olvidar las tramas y muestras de entrada que ya no se usarán
+        first = int(self._time)
+        for index in [index for index in self._spectra if index < first]:
+            del self._spectra[index]
+        drop = first * self.hop - self._input_offset
+        if drop > 0:
+            self._input = self._input[drop:]
+            self._input_offset += drop
+
+    def _drain(self, upto):
+        count = upto - self._output_start
+        ready = self._output[:count]
+        self._output = self._output[count:]
+        self._output_start += count
+
+        if self._skip:
+            cut = min(self._skip, len(ready))
+            ready = ready[cut:]
+            self._skip -= cut
+        if self._limit is not None:
+            ready = ready[:max(0, self._limit - self._emitted)]
+        self._emitted += len(ready)
+        return ready
+
+    def process(self, block):
+        """Procesa un bloque de entrada y devuelve las muestras de salida ya terminadas"""
+        block = np.asarray(block, dtype=np.float32).reshape(-1)
+        self._consumed += len(block)
+        self._input = np.concatenate([self._input, block])
+        self._run()
+        return self._drain(self._out_frames * self.out_hop)
+
+    def flush(self):
+        """Procesa lo que queda y devuelve el final de la salida"""
+        self._input = np.concatenate([self._input, np.zeros(self.n_fft * 2, dtype=np.float32)])
+        self._limit = int(round(self._consumed / self.speed))
+        self._run()
+        tail = self._drain(self._output_start + len(self._output))
+        missing = self._limit - self._emitted
+        if missing > 0:
+            tail = np.concatenate([tail, np.zeros(missing, dtype=np.float32)])
+            self._emitted += missing
+        return tail
+
+def fft_size_for_rate(rate, seconds=0.046):
+    """Potencia de dos más cercana a ~46 ms (2048 muestras a 44.1 kHz)"""
+    return int(2 ** round(np.log2(rate * seconds)))
+
+def transform_voice(samples, rate, speed=1.0, pitch_steps=0.0, gain=1.0):
+    """Versión en memoria: todo el audio de una vez"""
+    samples = np.asarray(samples, dtype=np.float32)
+    if speed == 1.0 and pitch_steps == 0:
+        return samples * np.float32(gain)
+    transform = VoiceTransform(speed, pitch_steps, gain, fft_size_for_rate(rate))
+    return np.concatenate([transform.process(samples), transform.flush()])
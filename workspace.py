@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from config import WORKSPACE_ROOT, WORKSPACE_MIN_FREE_MB, RESUMABLE_WORKSPACE_TTL_HOURS
+
+WORKSPACE_PREFIX = "dubjob_"
+RESUMABLE_PREFIX = "dubresume_"
+
+def _has_free_space(path, min_free_mb):
+    try:
+        return shutil.disk_usage(path).free >= min_free_mb * 1024 * 1024
+    except OSError:
+        return False
+
+def default_workspace_root():
+    """Elige dónde crear los directorios de trabajo (tmpfs si es posible)"""
+    if WORKSPACE_ROOT:
+        return WORKSPACE_ROOT
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK) and _has_free_space(shm, WORKSPACE_MIN_FREE_MB):
+        return shm
+    return tempfile.gettempdir()
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def cleanup_stale_workspaces(root=None, keep=()):
+    """Borra directorios de trabajo que dejaron procesos ya terminados
+
+    keep son los job_id en curso: su directorio reanudable no se toca aunque sea antiguo.
+    """
+    root = root or default_workspace_root()
+    try:
+        entries = os.listdir(root)
+    except OSError:
+        return 0
+
+    removed = 0
+    expiry = time.time() - RESUMABLE_WORKSPACE_TTL_HOURS * 3600
+    for name in entries:
+        path = os.path.join(root, name)
+        if name.startswith(RESUMABLE_PREFIX):
+            if name[len(RESUMABLE_PREFIX):] in keep:
+                continue
+            # Trabajos fallidos que nadie reanudó a tiempo
+            try:
+                if os.path.getmtime(path) < expiry:
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+            except OSError:
+                pass
+            continue
+        if not name.startswith(WORKSPACE_PREFIX):
+            continue
+        try:
+            pid = int(name[len(WORKSPACE_PREFIX):].split('_')[0])
+        except ValueError:
+            continue
+        if pid != os.getpid() and not _pid_alive(pid):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+class JobWorkspace:
+    """Directorio temporal aislado para un trabajo de doblaje
+
+    Con job_id el directorio es estable y se conserva si el trabajo falla,
+    para poder reanudarlo desde el último segmento terminado.
+    """
+
+    def __init__(self, root=None, job_id=None):
+        self.root = root or default_workspace_root()
+        self.job_id = job_id
+        self.path = None
+
+    def __enter__(self):
+        os.makedirs(self.root, exist_ok=True)
+        if self.job_id:
+            self.path = os.path.join(self.root, f"{RESUMABLE_PREFIX}{self.job_id}")
+            os.makedirs(self.path, exist_ok=True)
+        else:
+            self.path = tempfile.mkdtemp(prefix=f"{WORKSPACE_PREFIX}{os.getpid()}_", dir=self.root)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None or not self.job_id:
+            self.cleanup()
+        return False
+
+    def load_json(self, name):
+        """Lee un estado guardado del trabajo (None si no existe)"""
+        path = self.file(name)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_json(self, name, data):
+        """Guarda un estado del trabajo de forma atómica"""
+        path = self.file(name)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def file(self, name):
+        """Ruta de un archivo dentro del directorio de trabajo"""
+        return os.path.join(self.path, name)
+
+    def subdir(self, name):
+        """Crea (si hace falta) y devuelve un subdirectorio del trabajo"""
+        path = os.path.join(self.path, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def cleanup(self):
+        if self.path and os.path.exists(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+        self.path = None